@@ -1,6 +1,7 @@
 from collections import OrderedDict
 from dataclasses import dataclass
 from lstore.config import PAGE_SIZE
+from lstore.compression import EncodedPage
 
 
 @dataclass
@@ -9,6 +10,8 @@ class BufferFrame:
     num_records: int
     dirty: bool = False
     pin_count: int = 0
+    # EncodedPage for a compressed merged base page; data then holds the encoded bytes
+    encoded: object = None
 
 
 class BufferPool:
@@ -39,6 +42,10 @@ class BufferPool:
         if raw is None:
             data = bytearray(PAGE_SIZE)
             count = 0
+        elif self.disk_manager.is_page_encoded(table_name, is_tail, column, page_index):
+            # Compressed pages stay encoded in memory too
+            encoded = EncodedPage(raw)
+            return BufferFrame(data=encoded.data, num_records=encoded.num_records, encoded=encoded)
         else:
             # concurrent IO can expose short reads
             # make every frame at fixed PAGE_SIZE bytes 
@@ -49,7 +56,8 @@ class BufferPool:
             count = self.disk_manager.read_page_count(table_name, is_tail, column, page_index)
             if count < 0:
                 count = 0
-            max_records = PAGE_SIZE // 8
+            # int8 columns are the narrowest: one byte per cell
+            max_records = PAGE_SIZE
             if count > max_records:
                 count = max_records
         return BufferFrame(data=data, num_records=count)
@@ -130,7 +138,9 @@ class BufferPool:
         if not frame.dirty:
             return True
         table_name, is_tail, column, page_index = key
-        self.disk_manager.write_page(table_name, is_tail, column, page_index, frame.data, frame.num_records)
+        self.disk_manager.write_page(
+            table_name, is_tail, column, page_index, frame.data, frame.num_records, encoded=frame.encoded is not None
+        )
         frame.dirty = False
         return True
 
@@ -154,5 +164,12 @@ class BufferPool:
         self.lru.pop(key, None)
         return True
 
+    def discard_table(self, table_name):
+        # Drop every frame of one table without writing anything back
+        for key in [key for key in self.frames if key[0] == table_name]:
+            self.frames.pop(key, None)
+            self.lru.pop(key, None)
+        return True
+
     def size(self):
         return len(self.frames)
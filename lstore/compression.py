@@ -0,0 +1,259 @@
+"""
+Encodings for immutable (merged) base pages.
+
+A page of n integers is encoded with whichever of these is smallest:
+- FOR: frame of reference, values stored as bit-packed offsets from the page minimum
+- DELTA: bit-packed differences between neighbours, with a full value (anchor) every
+  DELTA_ANCHOR_INTERVAL values so a random read decodes at most one block
+- RLE: runs of equal values, as bit-packed run values and run end positions
+- DICT: sorted distinct values plus one bit-packed code per value
+
+Every encoding keeps random access (get) and can answer a range predicate (match)
+without decoding the whole page: FOR and DICT compare packed codes, RLE tests runs.
+
+Layout: 1 byte encoding id, 2 bytes value count, then the encoding's own fields.
+Packed integer lists are stored as (base >q, bit width B, little-endian bit-packed values - base).
+"""
+
+import struct
+from bisect import bisect_left, bisect_right
+
+FOR = 1
+DELTA = 2
+RLE = 3
+DICT = 4
+
+ENCODING_NAMES = {FOR: "for", DELTA: "delta", RLE: "rle", DICT: "dict"}
+
+DELTA_ANCHOR_INTERVAL = 64
+
+_HEADER = struct.Struct(">BH")
+_PACK_HEADER = struct.Struct(">qB")
+
+
+def _pack(values):
+    """
+    Bit-pack integers as offsets from their minimum. Returns the encoded bytes.
+    """
+    if len(values) == 0:
+        return _PACK_HEADER.pack(0, 0)
+    base = min(values)
+    width = (max(values) - base).bit_length()
+    packed = 0
+    if width > 0:
+        for i, value in enumerate(values):
+            packed |= (value - base) << (i * width)
+    nbytes = (len(values) * width + 7) // 8
+    return _PACK_HEADER.pack(base, width) + packed.to_bytes(nbytes, "little")
+
+
+class _Packed:
+    """
+    Reader for one _pack block starting at start; end is where the next field begins.
+    """
+
+    def __init__(self, data, start, count):
+        self.base, self.width = _PACK_HEADER.unpack_from(data, start)
+        self.start = start + _PACK_HEADER.size
+        self.count = count
+        self.end = self.start + (count * self.width + 7) // 8
+        self.data = data
+        self.mask = (1 << self.width) - 1
+
+    def code(self, i):
+        # Packed offset of value i, without adding the base
+        if self.width == 0:
+            return 0
+        bit = i * self.width
+        first = self.start + (bit >> 3)
+        last = self.start + ((bit + self.width + 7) >> 3)
+        return (int.from_bytes(self.data[first:last], "little") >> (bit & 7)) & self.mask
+
+    def get(self, i):
+        return self.base + self.code(i)
+
+    def codes(self):
+        if self.width == 0:
+            return [0] * self.count
+        packed = int.from_bytes(self.data[self.start:self.end], "little")
+        width = self.width
+        mask = self.mask
+        return [(packed >> (i * width)) & mask for i in range(self.count)]
+
+    def values(self):
+        base = self.base
+        return [base + code for code in self.codes()]
+
+
+def _encode_for(values):
+    return _pack(values)
+
+
+def _encode_delta(values):
+    anchors = values[::DELTA_ANCHOR_INTERVAL]
+    # Deltas at anchor positions are not needed for decoding, but keeping them makes
+    # a non-negative delta base mean the whole page is sorted
+    deltas = [0] + [values[i] - values[i - 1] for i in range(1, len(values))]
+    return _pack(anchors) + _pack(deltas)
+
+
+def _encode_rle(values):
+    run_values = []
+    run_ends = []
+    for i, value in enumerate(values):
+        if len(run_values) > 0 and run_values[-1] == value:
+            run_ends[-1] = i + 1
+        else:
+            run_values.append(value)
+            run_ends.append(i + 1)
+    return struct.pack(">H", len(run_values)) + _pack(run_values) + _pack(run_ends)
+
+
+def _encode_dict(values):
+    distinct = sorted(set(values))
+    position = {value: code for code, value in enumerate(distinct)}
+    return struct.pack(">H", len(distinct)) + _pack(distinct) + _pack([position[value] for value in values])
+
+
+_ENCODERS = {FOR: _encode_for, DELTA: _encode_delta, RLE: _encode_rle, DICT: _encode_dict}
+
+
+def encode_page(values, width=8):
+    """
+    Smallest encoding of values, or None if none of them beats the plain width bytes per value.
+    """
+    if len(values) == 0:
+        return None
+    best = None
+    for encoding, encoder in _ENCODERS.items():
+        try:
+            payload = _HEADER.pack(encoding, len(values)) + encoder(values)
+        except struct.error:
+            # Deltas of values near the int64 limits do not fit the packed base
+            continue
+        if best is None or len(payload) < len(best):
+            best = payload
+    if best is None or len(best) >= len(values) * width:
+        return None
+    return best
+
+
+class EncodedPage:
+    """
+    Random-access reader over an encode_page payload.
+    Only the small side structures (anchors, runs, dictionary) are decoded up front.
+    """
+
+    def __init__(self, data):
+        self.data = bytes(data)
+        self.encoding, self.num_records = _HEADER.unpack_from(self.data, 0)
+        start = _HEADER.size
+        if self.encoding == FOR:
+            self.packed = _Packed(self.data, start, self.num_records)
+        elif self.encoding == DELTA:
+            num_anchors = (self.num_records + DELTA_ANCHOR_INTERVAL - 1) // DELTA_ANCHOR_INTERVAL
+            anchors = _Packed(self.data, start, num_anchors)
+            self.anchors = anchors.values()
+            self.deltas = _Packed(self.data, anchors.end, self.num_records)
+        elif self.encoding == RLE:
+            (num_runs,) = struct.unpack_from(">H", self.data, start)
+            run_values = _Packed(self.data, start + 2, num_runs)
+            self.run_values = run_values.values()
+            self.run_ends = _Packed(self.data, run_values.end, num_runs).values()
+        elif self.encoding == DICT:
+            (num_distinct,) = struct.unpack_from(">H", self.data, start)
+            dictionary = _Packed(self.data, start + 2, num_distinct)
+            self.dictionary = dictionary.values()
+            self.packed = _Packed(self.data, dictionary.end, self.num_records)
+        else:
+            raise ValueError("unknown page encoding " + str(self.encoding))
+
+    @property
+    def name(self):
+        return ENCODING_NAMES[self.encoding]
+
+    def get(self, offset):
+        if offset is None or offset < 0 or offset >= self.num_records:
+            return None
+        if self.encoding == FOR:
+            return self.packed.get(offset)
+        if self.encoding == DELTA:
+            block = offset // DELTA_ANCHOR_INTERVAL
+            first = block * DELTA_ANCHOR_INTERVAL
+            steps = offset - first
+            total = sum(self.deltas.code(i) for i in range(first + 1, offset + 1))
+            return self.anchors[block] + total + steps * self.deltas.base
+        if self.encoding == RLE:
+            return self.run_values[bisect_right(self.run_ends, offset)]
+        return self.dictionary[self.packed.code(offset)]
+
+    def values(self):
+        if self.encoding == FOR:
+            return self.packed.values()
+        if self.encoding == DELTA:
+            result = []
+            base = self.deltas.base
+            for i, code in enumerate(self.deltas.codes()):
+                if i % DELTA_ANCHOR_INTERVAL == 0:
+                    value = self.anchors[i // DELTA_ANCHOR_INTERVAL]
+                else:
+                    value += code + base
+                result.append(value)
+            return result
+        if self.encoding == RLE:
+            result = []
+            start = 0
+            for value, end in zip(self.run_values, self.run_ends):
+                result.extend([value] * (end - start))
+                start = end
+            return result
+        dictionary = self.dictionary
+        return [dictionary[code] for code in self.packed.codes()]
+
+    def match(self, low, high):
+        """
+        Offsets whose value lies in [low, high], evaluated on the encoded form.
+        """
+        if self.encoding == FOR:
+            base = self.packed.base
+            low_code = max(0, low - base)
+            high_code = min(self.packed.mask, high - base)
+            if low_code > high_code:
+                return []
+            if low_code == 0 and high_code == self.packed.mask:
+                return list(range(self.num_records))
+            return [i for i, code in enumerate(self.packed.codes()) if low_code <= code <= high_code]
+        if self.encoding == DICT:
+            # The dictionary is sorted, so the predicate becomes a range of codes
+            low_code = bisect_left(self.dictionary, low)
+            high_code = bisect_right(self.dictionary, high) - 1
+            if low_code > high_code:
+                return []
+            return [i for i, code in enumerate(self.packed.codes()) if low_code <= code <= high_code]
+        if self.encoding == RLE:
+            result = []
+            start = 0
+            for value, end in zip(self.run_values, self.run_ends):
+                if low <= value <= high:
+                    result.extend(range(start, end))
+                start = end
+            return result
+        if self.deltas.base >= 0:
+            # Non-decreasing page: binary search with random reads
+            left = self._search(low, False)
+            right = self._search(high, True)
+            return list(range(left, right))
+        return [i for i, value in enumerate(self.values()) if low <= value <= high]
+
+    def _search(self, target, after):
+        # First offset whose value is > target (after) or >= target
+        low = 0
+        high = self.num_records
+        while low < high:
+            middle = (low + high) // 2
+            value = self.get(middle)
+            if value < target or (after and value == target):
+                low = middle + 1
+            else:
+                high = middle
+        return low
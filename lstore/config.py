@@ -3,3 +3,13 @@ EVICTION_POLICY = 'LRU'
 PAGE_SIZE = 4096
 BASE_PAGES_PER_RANGE = 16
 MERGE_TAIL_PAGE_THRESHOLD = 1000000
+SCAN_BATCH_SIZE = 512
+AGGREGATE_INDEX_PENDING_LIMIT = 1024
+RECORD_CACHE_SIZE = 4096
+SPARSE_TAIL_CUMULATIVE_INTERVAL = 8
+TAIL_GC_KEEP_VERSIONS = 4
+TAIL_TS_INDEX_INTERVAL = 64
+COMPRESS_MERGED_PAGES = True
+COMPACTION_FILL_THRESHOLD = 0.5
+COMPACTION_DELETE_THRESHOLD = 4096
+QUERY_STATS_ENABLED = False
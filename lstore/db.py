@@ -1,13 +1,16 @@
-from lstore.table import Table
+from lstore.table import Table, TAIL_CUMULATIVE
 from lstore.disk_manager import DiskManager
 from lstore.bufferpool import BufferPool
+from lstore.partition import PartitionedTable, PARTITION_META_FILE
 from lstore.config import BUFFERPOOL_SIZE, PAGE_SIZE
 import os
+import json
 
 
 class Database():
     def __init__(self):
         self.tables = []
+        self.partitioned_tables = []
         self.disk_manager = None
         self.bufferpool = None
     # Not required for milestone1
@@ -22,6 +25,9 @@ class Database():
             table_path = os.path.join(path, table_name)
             if not os.path.isdir(table_path):
                 continue
+            if os.path.exists(os.path.join(table_path, PARTITION_META_FILE)):
+                self.load_partitioned_table(table_name)
+                continue
             meta_path = os.path.join(table_path, "metadata.txt")
             if not os.path.exists(meta_path):
                 continue
@@ -31,29 +37,66 @@ class Database():
             self.bufferpool.flush_all()
         for table in self.tables:
             table.save(self.disk_manager)
+        for table in self.partitioned_tables:
+            table.close()
+        self.partitioned_tables = []
     """
     # Creates a new table
     :param name: string         #Table name
     :param num_columns: int     #Number of Columns: all columns are integer
     :param key: int             #Index of table key in columns
+    :param tail_storage: string #"cumulative" (full tail rows), "sparse" (updated columns only) or "row" (whole-record tail pages)
+    :param column_types: list   #Per-column "int8", "int16", "int32", "int64" (default) or "string", e.g. ["int64", "string", "int8"]
     """
-    def create_table(self, name, num_columns, key_index):
+    def create_table(self, name, num_columns, key_index, tail_storage=TAIL_CUMULATIVE, column_types=None):
         existing = self.get_table(name)
         if existing is not None:
             return existing
-        table = Table(name, num_columns, key_index)
+        table = Table(name, num_columns, key_index, tail_storage, column_types)
         table.bind_storage(self.bufferpool, self.disk_manager)
         self.tables.append(table)
         return table
 
     """
-    # Deletes the specified table
+    # Creates a table split by primary key across worker processes
+    :param num_partitions: int      #Number of partitions for hash partitioning
+    :param boundaries: list[int]    #Sorted split keys for range partitioning instead
+    """
+    def create_partitioned_table(self, name, num_columns, key_index, num_partitions=None, boundaries=None):
+        for table in self.partitioned_tables:
+            if table.name == name:
+                return table
+        table_path = os.path.join(self.disk_manager.path, name)
+        table = PartitionedTable(table_path, name, num_columns, key_index, num_partitions, boundaries)
+        self.partitioned_tables.append(table)
+        return table
+
+    def load_partitioned_table(self, table_name):
+        # Schema is read back from the first partition's own metadata
+        table_path = os.path.join(self.disk_manager.path, table_name)
+        meta_path = os.path.join(table_path, "partition_0", table_name, "metadata.txt")
+        if not os.path.exists(meta_path):
+            return
+        f = open(meta_path, "r")
+        num_columns = int(f.readline())
+        key = int(f.readline())
+        f.close()
+        table = PartitionedTable(table_path, table_name, num_columns, key)
+        self.partitioned_tables.append(table)
+
+    """
+    # Deletes the specified table, with its page files and bufferpool frames
     """
     def drop_table(self, name):
         for i in range(len(self.tables)):
             cur_table = self.tables[i]
             if cur_table.name == name:
                 self.tables.remove(cur_table)
+                cur_table.shutdown()
+                if self.bufferpool is not None:
+                    self.bufferpool.discard_table(name)
+                if self.disk_manager is not None:
+                    self.disk_manager.delete_table(name)
                 return True
         return False
 
@@ -77,9 +120,25 @@ class Database():
         key = int(f.readline())
         next_base_rid = int(f.readline())
         next_tail_rid = int(f.readline())
+        tail_storage = f.readline().strip() or TAIL_CUMULATIVE
+        types_line = f.readline().strip()
         f.close()
-        table = Table(table_name, num_columns, key)
+        column_types = types_line.split(",") if types_line else None
+        table = Table(table_name, num_columns, key, tail_storage, column_types)
         table.bind_storage(self.bufferpool, self.disk_manager)
+
+        dictionary_path = os.path.join(table_path, "string_dictionaries.txt")
+        if os.path.exists(dictionary_path):
+            f = open(dictionary_path, "r")
+            for raw_line in f:
+                line = raw_line.rstrip("\n")
+                split_idx = line.find("|")
+                if split_idx == -1:
+                    continue
+                column = int(line[:split_idx])
+                if column in table.dictionaries:
+                    table.dictionaries[column].encode(json.loads(line[split_idx + 1:]))
+            f.close()
         table.next_base_rid = next_base_rid
         table.next_tail_rid = next_tail_rid
         records_per_page = PAGE_SIZE // 8
@@ -87,6 +146,7 @@ class Database():
         # To locate existing base page slots from disk
         # not reading all page from memory
         base_path = os.path.join(table_path, "base")
+        present = set()
         if os.path.exists(base_path):
             for col in os.listdir(base_path):
                 col_path = os.path.join(base_path, col)
@@ -97,10 +157,15 @@ class Database():
                     if not file.endswith(".bin"):
                         continue
                     page_index = int(file.replace(".bin", ""))
+                    present.add((col_index, page_index))
                     while len(table.base_pages[col_index]) <= page_index:
                         table.base_pages[col_index].append(None)
         for col in range(table.total_columns):
             table.current_base_page_index[col] = max(0, len(table.base_pages[col]) - 1)
+            # Slots without a file were freed by merge or compaction
+            for page_index in range(table.current_base_page_index[col]):
+                if (col, page_index) not in present:
+                    table.freed_base_pages.add((col, page_index))
 
         # finding existing base page slots from disk
         # not reading all page from memory
@@ -117,7 +182,7 @@ class Database():
                     page_index = int(file.replace(".bin", ""))
                     while len(table.tail_pages[col_index]) <= page_index:
                         table.tail_pages[col_index].append(None)
-        for col in range(table.total_columns):
+        for col in range(table.tail_columns):
             table.current_tail_page_index[col] = max(0, len(table.tail_pages[col]) - 1)
 
         pd_path = os.path.join(table_path, "page_directory.txt")
@@ -151,8 +216,12 @@ class Database():
                 if rid > 0:
                     table.base_rids.add(rid)
                 else:
-                    rid_entry = entries[1]
-                    range_to_tail_pages.setdefault(rid_entry[2], set()).add(rid_entry[3])
+                    # Per column, since sparse tails advance each column's pages independently
+                    for entry in entries:
+                        if entry[4] is None:
+                            continue
+                        range_pages = range_to_tail_pages.setdefault(entry[2], {})
+                        range_pages.setdefault(table._tail_cell_column(entry), set()).add(entry[3])
             f.close()
 
             tps_path = os.path.join(table_path, "tps.txt")
@@ -180,6 +249,30 @@ class Database():
                     table.star_tail_record.add(int(line))
                 f.close()
 
+            ts_path = os.path.join(table_path, "tail_ts_index.txt")
+            if os.path.exists(ts_path):
+                f = open(ts_path, "r")
+                for raw_line in f:
+                    fields = raw_line.strip().split("|")
+                    if len(fields) != 3:
+                        continue
+                    timestamps, rids = table.tail_ts_index.setdefault(int(fields[0]), ([], []))
+                    timestamps.append(int(fields[1]))
+                    rids.append(int(fields[2]))
+                f.close()
+
+            zone_path = os.path.join(table_path, "zone_maps.txt")
+            if os.path.exists(zone_path):
+                zones_by_mark = {"P": table.page_zone_maps, "R": table.range_zone_maps, "T": table.tail_zone_maps}
+                f = open(zone_path, "r")
+                for raw_line in f:
+                    fields = raw_line.strip().split("|")
+                    if len(fields) != 5 or fields[0] not in zones_by_mark:
+                        continue
+                    zone_key = (int(fields[1]), int(fields[2]))
+                    zones_by_mark[fields[0]][zone_key] = [int(fields[3]), int(fields[4])]
+                f.close()
+
             for rid in sorted(table.base_rids):
                 base_record = table.read_record(rid)
                 if base_record is None:
@@ -214,14 +307,18 @@ class Database():
                         directory.append(('N', col, range_index, page_index, offset_in_page))
                     else:
                         directory.append(('B', col, range_index, page_index, offset_in_page))
-                else:
+                elif col < 4:
                     directory.append(('B', col, range_index, page_index, offset_in_page))
+                else:
+                    # narrow data columns hold more cells per page
+                    col_page, col_offset = divmod(offset, table.cells_per_page[col])
+                    directory.append(('B', col, range_index, col_page, col_offset))
 
             table.page_directory[rid] = directory
             table.base_rids.add(rid)
 
-            key_col = 4 + table.key
-            key_value = table._read_cell(False, key_col, page_index, offset_in_page)
+            key_entry = directory[4 + table.key]
+            key_value = table._read_cell(False, key_entry[1], key_entry[3], key_entry[4])
             if key_value is not None:
                 table.index.insert_key(key_value, rid)
 
@@ -269,7 +366,9 @@ class Database():
                     else:
                         range_index = 0
             tail_range[rid] = range_index
-            range_to_tail_pages.setdefault(range_index, set()).add(page_index)
+            range_pages = range_to_tail_pages.setdefault(range_index, {})
+            for col in range(table.total_columns):
+                range_pages.setdefault(col, set()).add(page_index)
 
             directory = []
             if indirection_value is None or indirection_value == 0:
@@ -0,0 +1,32 @@
+class StringDictionary:
+    """
+    Per-column dictionary for string columns: an append-only heap of strings plus a
+    hash from string to its code (its position in the heap). Pages store the codes,
+    so equality predicates and indexes work on plain integers.
+    Codes are never reused or reassigned, so stored codes stay valid.
+    """
+
+    def __init__(self):
+        self.strings = []  # code -> string
+        self.codes = {}  # string -> code
+
+    def encode(self, value):
+        # Code of value, adding it to the heap the first time it is seen
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.strings)
+            self.strings.append(value)
+            self.codes[value] = code
+        return code
+
+    def lookup(self, value):
+        # Code of value without adding it; None if it was never stored
+        return self.codes.get(value)
+
+    def decode(self, code):
+        if code is None or code < 0 or code >= len(self.strings):
+            return None
+        return self.strings[code]
+
+    def __len__(self):
+        return len(self.strings)
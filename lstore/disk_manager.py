@@ -1,4 +1,5 @@
 import os
+import shutil
 from lstore.config import PAGE_SIZE
 
 class DiskManager():
@@ -6,13 +7,14 @@ class DiskManager():
     DiskManager functions to provide a persistence layer for L-Store pages.
     
     - The function stores raw page bytes in .bin, and store valid records numbers in .cnt.
+    - Compressed pages are stored unpadded, with an "E" line after the count in .cnt.
     """
     
     def __init__(self, path):
         self.path = path
         os.makedirs(path, exist_ok=True)
 
-    def write_page(self, table_name, is_tail, column, page_index, data, num_records):
+    def write_page(self, table_name, is_tail, column, page_index, data, num_records, encoded=False):
         table_path = os.path.join(self.path, table_name)
         page_type = "tail" if is_tail else "base"
         type_path = os.path.join(table_path, page_type)
@@ -22,10 +24,12 @@ class DiskManager():
         # raw page bytes
         file_path = os.path.join(col_path, str(page_index) + ".bin")
         payload = bytes(data)
-        if len(payload) < PAGE_SIZE:
-            payload = payload + bytes(PAGE_SIZE - len(payload))
-        elif len(payload) > PAGE_SIZE:
-            payload = payload[:PAGE_SIZE]
+        # compressed pages keep their encoded length
+        if not encoded:
+            if len(payload) < PAGE_SIZE:
+                payload = payload + bytes(PAGE_SIZE - len(payload))
+            elif len(payload) > PAGE_SIZE:
+                payload = payload[:PAGE_SIZE]
         f = open(file_path, "wb")
         f.write(payload)
         f.close()
@@ -34,6 +38,8 @@ class DiskManager():
         cnt_path = os.path.join(col_path, str(page_index) + ".cnt")
         f = open(cnt_path, "w")
         f.write(str(num_records))
+        if encoded:
+            f.write("\nE")
         f.close()
 
     def read_page(self, table_name, is_tail, column, page_index):
@@ -75,6 +81,25 @@ class DiskManager():
             return 0
         return int(s)
 
+    def is_page_encoded(self, table_name, is_tail, column, page_index):
+        page_type = "tail" if is_tail else "base"
+        cnt_path = os.path.join(
+            self.path,
+            table_name,
+            page_type,
+            str(column),
+            str(page_index) + ".cnt"
+        )
+
+        if not os.path.exists(cnt_path):
+            return False
+
+        f = open(cnt_path, "r")
+        f.readline()
+        flag = f.readline().strip()
+        f.close()
+        return flag == "E"
+
     def delete_page(self, table_name, is_tail, column, page_index):
         page_type = "tail" if is_tail else "base"
         base = os.path.join(
@@ -91,3 +116,13 @@ class DiskManager():
         if os.path.exists(cnt_path):
             os.remove(cnt_path)
         return True
+
+    def delete_table_pages(self, table_name):
+        # Every base and tail page file of the table, one directory tree each
+        for page_type in ("base", "tail"):
+            shutil.rmtree(os.path.join(self.path, table_name, page_type), ignore_errors=True)
+        return True
+
+    def delete_table(self, table_name):
+        shutil.rmtree(os.path.join(self.path, table_name), ignore_errors=True)
+        return True
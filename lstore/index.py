@@ -3,6 +3,113 @@ This functions to build Index manager for key and optional secondary columns.
 """
 
 from bisect import bisect_left, bisect_right, insort
+from lstore.config import AGGREGATE_INDEX_PENDING_LIMIT
+
+
+class AggregateIndex:
+    """
+    Prefix sums of one column in primary-key order, kept in a Fenwick tree so a
+    key-range sum is O(log n) whatever the range width.
+    Keys larger than every key so far are appended to the tree directly; keys that
+    arrive out of order wait in a small sorted side list until a rebuild folds them in.
+    Deleted keys keep their slot with value 0 until the next rebuild.
+    """
+
+    def __init__(self, keys=(), values=()):
+        self.rebuild(list(zip(keys, values)))
+
+    def rebuild(self, items=None):
+        if items is None:
+            items = [(key, value) for key, value in zip(self.keys, self.values) if key not in self.dead]
+            items.extend(self.pending.items())
+            items.sort()
+        self.keys = [key for key, _ in items]
+        self.values = [value for _, value in items]
+        self.position = {key: i for i, key in enumerate(self.keys)}
+        self.dead = set()
+        self.pending_keys = []
+        self.pending = {}
+        # Linear-time Fenwick build: push each node's sum up to its parent
+        tree = [0] + list(self.values)
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def _add(self, slot, delta):
+        i = slot + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, count):
+        total = 0
+        while count > 0:
+            total += self.tree[count]
+            count -= count & -count
+        return total
+
+    def _append(self, key, value):
+        # Node i covers slots (i - lowbit(i), i]: the new value plus the earlier slots it spans
+        i = len(self.tree)
+        self.tree.append(value + self._prefix(i - 1) - self._prefix(i - (i & -i)))
+        self.position[key] = len(self.keys)
+        self.keys.append(key)
+        self.values.append(value)
+
+    def insert(self, key, value):
+        if key in self.position or key in self.pending:
+            self.update(key, value)
+            self.dead.discard(key)
+            return
+        if len(self.keys) == 0 or key > self.keys[-1]:
+            self._append(key, value)
+            return
+        insort(self.pending_keys, key)
+        self.pending[key] = value
+        if len(self.pending) > AGGREGATE_INDEX_PENDING_LIMIT:
+            self.rebuild()
+
+    def update(self, key, value):
+        slot = self.position.get(key)
+        if slot is not None:
+            self._add(slot, value - self.values[slot])
+            self.values[slot] = value
+        elif key in self.pending:
+            self.pending[key] = value
+
+    def delete(self, key):
+        if key in self.position:
+            self.update(key, 0)
+            self.dead.add(key)
+        elif key in self.pending:
+            self.pending.pop(key)
+            i = bisect_left(self.pending_keys, key)
+            self.pending_keys.pop(i)
+
+    def delete_many(self, keys):
+        # Past a fraction of the tree, one linear rebuild beats a log-time update per key
+        if len(keys) * 16 < len(self.keys):
+            for key in keys:
+                self.delete(key)
+            return
+        for key in keys:
+            if key in self.position:
+                self.dead.add(key)
+            else:
+                self.pending.pop(key, None)
+        self.rebuild()
+
+    def range_sum(self, begin, end):
+        left = bisect_left(self.keys, begin)
+        right = bisect_right(self.keys, end)
+        total = self._prefix(right) - self._prefix(left) if right > left else 0
+        left = bisect_left(self.pending_keys, begin)
+        right = bisect_right(self.pending_keys, end)
+        for key in self.pending_keys[left:right]:
+            total += self.pending[key]
+        return total
 
 
 class Index:
@@ -13,6 +120,15 @@ class Index:
         # Primary-key index: key value -> base RID
         self.indices[self.table.key] = {}
         self.sorted_keys = []
+        # Ordered secondary indexes: sorted distinct values per column, None if unordered
+        self.sorted_values = [None] * table.num_columns
+        # Composite indexes: column tuple -> {value tuple -> set(rid)}, plus sorted value tuples
+        self.composite_indices = {}
+        self.composite_sorted = {}
+        # Aggregate (prefix-sum) indexes: column -> AggregateIndex
+        self.aggregate_indices = {}
+        # Online builds in progress: column -> [(value, rid, added)] written since the build began
+        self._build_logs = {}
 
     def insert_key(self, key, rid):
         key_index = self.indices[self.table.key]
@@ -22,14 +138,37 @@ class Index:
         insort(self.sorted_keys, key)
         return True
 
+    def insert_keys(self, keys, rids):
+        """
+        Bulk version of insert_key. The caller guarantees the keys are new and distinct.
+        """
+        key_index = self.indices[self.table.key]
+        for key, rid in zip(keys, rids):
+            key_index[key] = rid
+        # Appending keys in order is the common case; sort() then only merges two runs
+        self.sorted_keys.extend(keys)
+        self.sorted_keys.sort()
+        return True
+
     def _insert_secondary(self, column, value, rid):
         if self.indices[column] is None:
+            log = self._build_logs.get(column)
+            if log is not None:
+                log.append((value, rid, True))
             return
-        bucket = self.indices[column].setdefault(value, set())
+        bucket = self.indices[column].get(value)
+        if bucket is None:
+            bucket = set()
+            self.indices[column][value] = bucket
+            if self.sorted_values[column] is not None:
+                insort(self.sorted_values[column], value)
         bucket.add(rid)
 
     def _remove_secondary(self, column, value, rid):
         if self.indices[column] is None:
+            log = self._build_logs.get(column)
+            if log is not None:
+                log.append((value, rid, False))
             return
         bucket = self.indices[column].get(value)
         if bucket is None:
@@ -37,6 +176,35 @@ class Index:
         bucket.discard(rid)
         if len(bucket) == 0:
             self.indices[column].pop(value, None)
+            values = self.sorted_values[column]
+            if values is not None:
+                i = bisect_left(values, value)
+                if i < len(values) and values[i] == value:
+                    values.pop(i)
+
+    def _insert_composite(self, columns_key, columns, rid):
+        value = tuple(columns[col] for col in columns_key)
+        index = self.composite_indices[columns_key]
+        bucket = index.get(value)
+        if bucket is None:
+            bucket = set()
+            index[value] = bucket
+            insort(self.composite_sorted[columns_key], value)
+        bucket.add(rid)
+
+    def _remove_composite(self, columns_key, columns, rid):
+        value = tuple(columns[col] for col in columns_key)
+        index = self.composite_indices[columns_key]
+        bucket = index.get(value)
+        if bucket is None:
+            return
+        bucket.discard(rid)
+        if len(bucket) == 0:
+            index.pop(value, None)
+            values = self.composite_sorted[columns_key]
+            i = bisect_left(values, value)
+            if i < len(values) and values[i] == value:
+                values.pop(i)
 
     def add_record(self, rid, columns):
         """
@@ -46,9 +214,31 @@ class Index:
         for col in range(self.table.num_columns):
             if col == self.table.key:
                 continue
-            if self.indices[col] is None:
+            if self.indices[col] is None and col not in self._build_logs:
                 continue
             self._insert_secondary(col, columns[col], rid)
+        for columns_key in self.composite_indices:
+            self._insert_composite(columns_key, columns, rid)
+        for col, aggregate in self.aggregate_indices.items():
+            aggregate.insert(columns[self.table.key], columns[col])
+
+    def add_records(self, rids, rows):
+        """
+        Bulk version of add_record, one secondary index at a time.
+        """
+        for col in range(self.table.num_columns):
+            if col == self.table.key:
+                continue
+            if self.indices[col] is None and col not in self._build_logs:
+                continue
+            for rid, row in zip(rids, rows):
+                self._insert_secondary(col, row[col], rid)
+        for columns_key in self.composite_indices:
+            for rid, row in zip(rids, rows):
+                self._insert_composite(columns_key, row, rid)
+        for col, aggregate in self.aggregate_indices.items():
+            for row in rows:
+                aggregate.insert(row[self.table.key], row[col])
 
     def remove_record(self, rid, columns):
         """
@@ -57,9 +247,13 @@ class Index:
         for col in range(self.table.num_columns):
             if col == self.table.key:
                 continue
-            if self.indices[col] is None:
+            if self.indices[col] is None and col not in self._build_logs:
                 continue
             self._remove_secondary(col, columns[col], rid)
+        for columns_key in self.composite_indices:
+            self._remove_composite(columns_key, columns, rid)
+        for aggregate in self.aggregate_indices.values():
+            aggregate.delete(columns[self.table.key])
 
     def update_record(self, rid, old_columns, new_columns):
         """
@@ -68,7 +262,7 @@ class Index:
         for col in range(self.table.num_columns):
             if col == self.table.key:
                 continue
-            if self.indices[col] is None:
+            if self.indices[col] is None and col not in self._build_logs:
                 continue
             old_val = old_columns[col]
             new_val = new_columns[col]
@@ -76,6 +270,14 @@ class Index:
                 continue
             self._remove_secondary(col, old_val, rid)
             self._insert_secondary(col, new_val, rid)
+        for columns_key in self.composite_indices:
+            if all(old_columns[col] == new_columns[col] for col in columns_key):
+                continue
+            self._remove_composite(columns_key, old_columns, rid)
+            self._insert_composite(columns_key, new_columns, rid)
+        for col, aggregate in self.aggregate_indices.items():
+            if old_columns[col] != new_columns[col]:
+                aggregate.update(new_columns[self.table.key], new_columns[col])
 
     def locate(self, column, value):
         if column < 0 or column >= self.table.num_columns:
@@ -89,16 +291,164 @@ class Index:
             return ()
         # Return the internal set directly to avoid per-query list copies.
         return rid_set
-    # To locate matching records:= column == value
+
+    def locate_composite(self, columns, prefix, begin=None, end=None):
+        """
+        RIDs from the composite index on columns whose leading values equal prefix and,
+        when begin/end are given, whose next column lies in [begin, end].
+        """
+        columns_key = tuple(columns)
+        index = self.composite_indices.get(columns_key)
+        if index is None:
+            return None
+        prefix = tuple(prefix)
+        has_range = begin is not None or end is not None
+        if len(prefix) == len(columns_key) and not has_range:
+            return set(index.get(prefix, ()))
+        values = self.composite_sorted[columns_key]
+        depth = len(prefix)
+        if has_range and begin is not None:
+            i = bisect_left(values, prefix + (begin,))
+        else:
+            i = bisect_left(values, prefix)
+        rids = set()
+        while i < len(values):
+            value = values[i]
+            if value[:depth] != prefix:
+                break
+            if has_range and end is not None and value[depth] > end:
+                break
+            rids.update(index[value])
+            i += 1
+        return rids
+
+    def locate_predicates(self, equal, ranges):
+        """
+        RID sets from every index usable for a conjunction of column == value (equal)
+        and low <= column <= high (ranges) predicates.
+        Returns a list of (rid_set, answered_columns); the sets are exact for the
+        columns they answer and may be shared internal sets, so do not mutate them.
+        """
+        key_column = self.table.key
+        if key_column in equal:
+            rid = self.indices[key_column].get(equal[key_column])
+            return [(set() if rid is None else {rid}, {key_column})]
+        candidates = []
+        for col, value in equal.items():
+            if self.indices[col] is not None:
+                candidates.append((self.locate(col, value), {col}))
+        for col, (begin, end) in ranges.items():
+            if self.is_ordered(col):
+                candidates.append((self.locate_range(begin, end, col), {col}))
+        for columns_key in self.composite_indices:
+            depth = 0
+            while depth < len(columns_key) and columns_key[depth] in equal:
+                depth += 1
+            prefix = tuple(equal[col] for col in columns_key[:depth])
+            answered = set(columns_key[:depth])
+            if depth < len(columns_key) and columns_key[depth] in ranges:
+                begin, end = ranges[columns_key[depth]]
+                answered.add(columns_key[depth])
+                rids = self.locate_composite(columns_key, prefix, begin, end)
+            elif depth > 0:
+                rids = self.locate_composite(columns_key, prefix)
+            else:
+                continue
+            # A composite index is only worth it when it adds an answered column
+            if any(answered <= other for _, other in candidates):
+                continue
+            candidates.append((rids, answered))
+        return candidates
+
+    def is_ordered(self, column):
+        return column == self.table.key or self.sorted_values[column] is not None
+
+    # To locate matching records:= begin <= column <= end
     def locate_range(self, begin, end, column):
         if column != self.table.key:
-            return []
+            values = self.sorted_values[column] if 0 <= column < self.table.num_columns else None
+            if values is None:
+                return []
+            left = bisect_left(values, begin)
+            right = bisect_right(values, end)
+            rids = []
+            for value in values[left:right]:
+                rids.extend(self.indices[column][value])
+            return rids
         left = bisect_left(self.sorted_keys, begin)
         right = bisect_right(self.sorted_keys, end)
         keys_in_range = self.sorted_keys[left:right]
         key_index = self.indices[self.table.key]
         return [key_index.get(pk) for pk in keys_in_range]
 
+    def keys_in_range(self, begin, end, limit, include_begin=True):
+        """
+        Up to limit primary keys in [begin, end] in order, or (begin, end] when include_begin is False.
+        """
+        if include_begin:
+            left = bisect_left(self.sorted_keys, begin)
+        else:
+            left = bisect_right(self.sorted_keys, begin)
+        keys = self.sorted_keys[left:left + limit]
+        return keys[:bisect_right(keys, end)]
+
+    def remove_records(self, rids, keys, rows=None):
+        """
+        Bulk version of remove_record. rows (the logical rows) only need the columns
+        listed by columns_for_remove, and may be None when it is empty; aggregate
+        indexes only need the keys.
+        """
+        for col in range(self.table.num_columns):
+            if col == self.table.key:
+                continue
+            if self.indices[col] is None and col not in self._build_logs:
+                continue
+            for rid, row in zip(rids, rows):
+                self._remove_secondary(col, row[col], rid)
+        for columns_key in self.composite_indices:
+            for rid, row in zip(rids, rows):
+                self._remove_composite(columns_key, row, rid)
+        for aggregate in self.aggregate_indices.values():
+            aggregate.delete_many(keys)
+
+    def columns_for_remove(self):
+        # Columns whose values remove_records needs: secondary, composite and building indexes
+        columns = set(self._build_logs)
+        for columns_key in self.composite_indices:
+            columns.update(columns_key)
+        for col in range(self.table.num_columns):
+            if col != self.table.key and self.indices[col] is not None:
+                columns.add(col)
+        return sorted(columns)
+
+    def delete_key_range(self, begin, end):
+        """
+        Drop the primary-key entries for keys in [begin, end] with one slice of sorted_keys.
+        Returns the removed keys in order.
+        """
+        left = bisect_left(self.sorted_keys, begin)
+        right = bisect_right(self.sorted_keys, end)
+        keys = self.sorted_keys[left:right]
+        del self.sorted_keys[left:right]
+        key_index = self.indices[self.table.key]
+        for key in keys:
+            key_index.pop(key, None)
+        return keys
+
+    def clear(self):
+        # Empty every index but keep which ones exist (used by Table.truncate)
+        for col in range(self.table.num_columns):
+            if self.indices[col] is not None:
+                self.indices[col] = {}
+            if self.sorted_values[col] is not None:
+                self.sorted_values[col] = []
+        self.sorted_keys = []
+        for columns_key in self.composite_indices:
+            self.composite_indices[columns_key] = {}
+            self.composite_sorted[columns_key] = []
+        for col in self.aggregate_indices:
+            self.aggregate_indices[col] = AggregateIndex()
+
     def delete_index(self, key):
         # current implementation with delete primary-key entry by key value
         key_index = self.indices[self.table.key]
@@ -110,28 +460,141 @@ class Index:
             self.sorted_keys.pop(i)
         return True
 
-    def create_index(self, column_number):
+    def create_index(self, column_number, ordered=False, online=False):
+        """
+        ordered=True also keeps the distinct values sorted so locate_range works on this column.
+        A tuple of columns builds a composite index over the tuple of latest values.
+        online=True builds without blocking writers (see _build_index_online).
+        """
+        if isinstance(column_number, (tuple, list)):
+            return self._create_composite_index(tuple(column_number))
         if column_number < 0 or column_number >= self.table.num_columns:
             return False
         if column_number == self.table.key:
             return True
         if self.indices[column_number] is not None:
+            if ordered and self.sorted_values[column_number] is None:
+                self.sorted_values[column_number] = sorted(self.indices[column_number].keys())
             return True
-        self.indices[column_number] = {}
-        # Build from current latest value of every existing base record
-        for rid in self.table.get_base_rids():
-            latest = self.table.read_latest_record(rid)
-            if latest is None:
-                continue
-            value = latest[4 + column_number]
-            self._insert_secondary(column_number, value, rid)
+        if column_number in self._build_logs:
+            return False
+        if online:
+            return self._build_index_online(column_number, ordered)
+        index = {}
+        for rids, indirections in self.table.scan_base_pages():
+            self._group_page(index, rids, self.table.read_latest_column(rids, column_number, indirections))
+        self._install_index(column_number, index, ordered)
+        return True
+
+    @staticmethod
+    def _group_page(index, rids, values):
+        # Bulk build: only the target column is read, grouped a page at a time
+        for rid, value in zip(rids, values):
+            bucket = index.get(value)
+            if bucket is None:
+                index[value] = {rid}
+            else:
+                bucket.add(rid)
+
+    def _install_index(self, column_number, index, ordered):
+        self.indices[column_number] = index
+        # One sort at the end instead of an insort per distinct value
+        self.sorted_values[column_number] = sorted(index.keys()) if ordered else None
+
+    def _build_index_online(self, column_number, ordered):
+        """
+        Build while writes continue. The table latch is held only to read one base page
+        of the column; grouping happens outside it. Secondary-index changes to the column
+        made meanwhile are logged and replayed at the end under the latch (catch-up), which
+        is safe because buckets are sets: the last logged change of a (value, rid) wins.
+        Until it is installed, locate on the column returns None and queries scan.
+        """
+        latch = self.table.latch
+        with latch:
+            log = []
+            self._build_logs[column_number] = log
+            pages = self.table.scan_base_pages()
+        index = {}
+        batch = ()
+        try:
+            while True:
+                with latch:
+                    batch = next(pages, None)
+                    if batch is None:
+                        break
+                    rids, indirections = batch
+                    values = self.table.read_latest_column(rids, column_number, indirections)
+                self._group_page(index, rids, values)
+        finally:
+            with latch:
+                self._build_logs.pop(column_number, None)
+                if batch is None:
+                    for value, rid, added in log:
+                        bucket = index.setdefault(value, set())
+                        if added:
+                            bucket.add(rid)
+                        else:
+                            bucket.discard(rid)
+                            if len(bucket) == 0:
+                                index.pop(value)
+                    self._install_index(column_number, index, ordered)
+        return True
+
+    def _create_composite_index(self, columns_key):
+        if len(columns_key) == 0:
+            return False
+        if any(col < 0 or col >= self.table.num_columns for col in columns_key):
+            return False
+        if columns_key in self.composite_indices:
+            return True
+        self.composite_indices[columns_key] = {}
+        self.composite_sorted[columns_key] = []
+        for rids, _ in self.table.scan_base_pages():
+            for rid, latest in zip(rids, self.table.read_latest_records(rids)):
+                if latest is None:
+                    continue
+                self._insert_composite(columns_key, latest[4:], rid)
         return True
 
     def drop_index(self, column_number):
+        if isinstance(column_number, (tuple, list)):
+            columns_key = tuple(column_number)
+            if columns_key not in self.composite_indices:
+                return False
+            self.composite_indices.pop(columns_key)
+            self.composite_sorted.pop(columns_key)
+            return True
         if column_number < 0 or column_number >= self.table.num_columns:
             return False
         if column_number == self.table.key:
             # Primary-key index cannot be dropped
             return False
         self.indices[column_number] = None
+        self.sorted_values[column_number] = None
+        return True
+
+    def create_aggregate_index(self, column_number):
+        """
+        Keep prefix sums of column_number in key order so Query.sum on it is O(log n).
+        """
+        if column_number < 0 or column_number >= self.table.num_columns:
+            return False
+        if column_number in self.aggregate_indices:
+            return True
+        key_index = self.indices[self.table.key]
+        keys = list(self.sorted_keys)
+        values = self.table.read_latest_column([key_index[key] for key in keys], column_number)
+        self.aggregate_indices[column_number] = AggregateIndex(keys, [0 if v is None else v for v in values])
         return True
+
+    def drop_aggregate_index(self, column_number):
+        return self.aggregate_indices.pop(column_number, None) is not None
+
+    def range_sum(self, begin, end, column):
+        """
+        Sum of column over keys in [begin, end] from its aggregate index, or None without one.
+        """
+        aggregate = self.aggregate_indices.get(column)
+        if aggregate is None:
+            return None
+        return aggregate.range_sum(begin, end)
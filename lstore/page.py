@@ -1,18 +1,22 @@
 import struct
 from lstore.config import PAGE_SIZE
 
-INT_SIZE = 8  # each record is a 64-bit integer in bytes
+INT_SIZE = 8  # each record is a 64-bit integer in bytes by default
 MAX_RECORDS_PER_PAGE = PAGE_SIZE // INT_SIZE
 
 class Page:
 
-    def __init__(self):
+    # type_code is a struct code: "q" int64 (default), "i" int32, "h" int16, "b" int8
+    def __init__(self, type_code="q"):
         self.num_records = 0
         self.data = bytearray(PAGE_SIZE)
+        self.cell = struct.Struct(">" + type_code)
+        self.width = self.cell.size
+        self.max_records = PAGE_SIZE // self.width
 
     # To check if there has capacity for the physical page
     def has_capacity(self):
-        return self.num_records < MAX_RECORDS_PER_PAGE
+        return self.num_records < self.max_records
 
     # To implement the write page function
     def write(self, value):
@@ -20,7 +24,7 @@ class Page:
             return None
         offset = self.num_records
         if value is not None:
-            struct.pack_into(">q", self.data, offset * INT_SIZE, value)
+            self.cell.pack_into(self.data, offset * self.width, value)
         self.num_records += 1
         return offset
     
@@ -28,15 +32,14 @@ class Page:
     def read(self, offset):
         if offset >= self.num_records:
             return None
-        return struct.unpack_from(">q", self.data, offset * INT_SIZE)[0]
+        return self.cell.unpack_from(self.data, offset * self.width)[0]
 
     # To implement the page update function 
     def update(self, offset, value):
         if offset >= self.num_records:
             return None
         if value is not None:
-            struct.pack_into(">q", self.data, offset * INT_SIZE, value)
+            self.cell.pack_into(self.data, offset * self.width, value)
         else: 
-            self.data[offset * INT_SIZE : offset * INT_SIZE + INT_SIZE] = bytearray(INT_SIZE)
+            self.data[offset * self.width : offset * self.width + self.width] = bytearray(self.width)
         return True
-
@@ -0,0 +1,256 @@
+"""
+Partitioned table: one logical table split by primary key across worker processes.
+
+Each partition is a normal Table owned by its own process, with its own
+bufferpool and storage directory, so queries on different partitions run on
+different cores instead of sharing one GIL.
+"""
+
+import multiprocessing
+import os
+import threading
+from bisect import bisect_right
+
+from lstore.query import Query
+
+PARTITION_META_FILE = "partitions.txt"
+
+
+def _partition_worker(conn, path, name, num_columns, key_index):
+    # Imported here because lstore.db imports this module
+    from lstore.db import Database
+
+    db = Database()
+    db.open(path)
+    table = db.create_table(name, num_columns, key_index)
+    query = Query(table)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        method, batch = message
+        try:
+            func = getattr(query, method)
+            results = [func(*args) for args in batch]
+            conn.send((True, results))
+        except Exception as e:
+            conn.send((False, e))
+    db.close()
+    conn.close()
+
+
+class PartitionedTable:
+
+    """
+    :param path: string             #Directory holding one sub-directory per partition
+    :param name: string             #Table name
+    :param num_columns: int         #Number of Columns: all columns are integer
+    :param key: int                 #Index of table key in columns
+    :param num_partitions: int      #Number of worker processes (hash partitioning)
+    :param boundaries: list[int]    #Sorted split keys; enables range partitioning with len + 1 partitions
+    """
+    def __init__(self, path, name, num_columns, key, num_partitions=None, boundaries=None):
+        self.path = path
+        self.name = name
+        self.num_columns = num_columns
+        self.key = key
+
+        # A layout already on disk wins, otherwise keys would be routed to the wrong partition
+        stored = self._load_layout()
+        if stored is not None:
+            num_partitions, boundaries = stored
+        if boundaries is not None:
+            boundaries = sorted(boundaries)
+            num_partitions = len(boundaries) + 1
+        if num_partitions is None:
+            num_partitions = os.cpu_count() or 1
+        self.num_partitions = max(1, int(num_partitions))
+        self.boundaries = boundaries
+        self._save_layout()
+
+        self.connections = []
+        self.processes = []
+        # One request per pipe at a time: callers on other threads must not read our replies
+        self._call_lock = threading.Lock()
+        for i in range(self.num_partitions):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_partition_worker,
+                args=(child_conn, self._partition_path(i), name, num_columns, key),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+
+    def _partition_path(self, i):
+        return os.path.join(self.path, "partition_" + str(i))
+
+    def _load_layout(self):
+        meta_path = os.path.join(self.path, PARTITION_META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        f = open(meta_path, "r")
+        num_partitions = int(f.readline())
+        line = f.readline().strip()
+        f.close()
+        boundaries = None if line in ("", "N") else [int(v) for v in line.split(",")]
+        return num_partitions, boundaries
+
+    def _save_layout(self):
+        os.makedirs(self.path, exist_ok=True)
+        meta_path = os.path.join(self.path, PARTITION_META_FILE)
+        f = open(meta_path, "w")
+        f.write(str(self.num_partitions) + "\n")
+        if self.boundaries is None:
+            f.write("N\n")
+        else:
+            f.write(",".join(str(int(v)) for v in self.boundaries) + "\n")
+        f.close()
+
+    def partition_of(self, key):
+        if self.boundaries is not None:
+            return bisect_right(self.boundaries, key)
+        return hash(key) % self.num_partitions
+
+    def partitions_for_range(self, start_range, end_range):
+        # Hash partitioning spreads every key range over all partitions
+        if self.boundaries is None:
+            return list(range(self.num_partitions))
+        return list(range(self.partition_of(start_range), self.partition_of(end_range) + 1))
+
+    def call(self, partitions, method, batches):
+        """
+        Send one batch to each partition first and only then collect the replies,
+        so all partitions work on their batch at the same time.
+        Every reply is received before the first error is raised, so no stale reply
+        is left in a pipe for the next call.
+        """
+        with self._call_lock:
+            for i, batch in zip(partitions, batches):
+                self.connections[i].send((method, batch))
+            replies = []
+            error = None
+            for i in partitions:
+                ok, payload = self.connections[i].recv()
+                if not ok and error is None:
+                    error = payload
+                replies.append(payload)
+        if error is not None:
+            raise error
+        return replies
+
+    def close(self):
+        with self._call_lock:
+            for conn in self.connections:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+            for process in self.processes:
+                process.join()
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+            self.processes = []
+
+
+class PartitionedQuery:
+    """
+    Same interface as Query, routed to the partition that owns each key.
+    Use execute_many to push a batch of operations to all partitions at once.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def _route_key(self, method, args):
+        if method == "insert":
+            return args[self.table.key]
+        return args[0]
+
+    def _single(self, method, key, args):
+        i = self.table.partition_of(key)
+        return self.table.call([i], method, [[args]])[0][0]
+
+    def _fan_out(self, partitions, method, args):
+        return [replies[0] for replies in self.table.call(partitions, method, [[args]] * len(partitions))]
+
+    @staticmethod
+    def _reduce_sum(results):
+        # Query.sum returns False for an empty range, so only an empty range everywhere is False
+        total = 0
+        found = False
+        for result in results:
+            if result is False:
+                continue
+            total += result
+            found = True
+        return total if found else False
+
+    def insert(self, *columns):
+        if len(columns) != self.table.num_columns:
+            return False
+        return self._single("insert", columns[self.table.key], columns)
+
+    def select(self, search_key, search_key_index, projected_columns_index):
+        args = (search_key, search_key_index, projected_columns_index)
+        if search_key_index == self.table.key:
+            return self._single("select", search_key, args)
+        result = []
+        for records in self._fan_out(list(range(self.table.num_partitions)), "select", args):
+            if records is False:
+                return False
+            result.extend(records)
+        return result
+
+    def select_version(self, search_key, search_key_index, projected_columns_index, relative_version):
+        args = (search_key, search_key_index, projected_columns_index, relative_version)
+        return self._single("select_version", search_key, args)
+
+    def select_as_of(self, search_key, timestamp, projected_columns_index):
+        return self._single("select_as_of", search_key, (search_key, timestamp, projected_columns_index))
+
+    def update(self, primary_key, *columns):
+        return self._single("update", primary_key, (primary_key,) + tuple(columns))
+
+    def delete(self, primary_key):
+        return self._single("delete", primary_key, (primary_key,))
+
+    def increment(self, key, column):
+        return self._single("increment", key, (key, column))
+
+    def sum(self, start_range, end_range, aggregate_column_index):
+        partitions = self.table.partitions_for_range(start_range, end_range)
+        results = self._fan_out(partitions, "sum", (start_range, end_range, aggregate_column_index))
+        return self._reduce_sum(results)
+
+    def sum_version(self, start_range, end_range, aggregate_column_index, relative_version):
+        partitions = self.table.partitions_for_range(start_range, end_range)
+        args = (start_range, end_range, aggregate_column_index, relative_version)
+        return self._reduce_sum(self._fan_out(partitions, "sum_version", args))
+
+    def sum_as_of(self, start_range, end_range, aggregate_column_index, timestamp):
+        partitions = self.table.partitions_for_range(start_range, end_range)
+        args = (start_range, end_range, aggregate_column_index, timestamp)
+        return self._reduce_sum(self._fan_out(partitions, "sum_as_of", args))
+
+    def execute_many(self, method, arg_list):
+        """
+        Run method once per argument tuple, grouped into one message per partition.
+        Results come back in the order of arg_list.
+        """
+        positions = {}
+        batches = {}
+        for pos, args in enumerate(arg_list):
+            i = self.table.partition_of(self._route_key(method, args))
+            batches.setdefault(i, []).append(tuple(args))
+            positions.setdefault(i, []).append(pos)
+        partitions = sorted(batches.keys())
+        replies = self.table.call(partitions, method, [batches[i] for i in partitions])
+        results = [None] * len(arg_list)
+        for i, partition_results in zip(partitions, replies):
+            for pos, result in zip(positions[i], partition_results):
+                results[pos] = result
+        return results
@@ -1,4 +1,6 @@
 from lstore.table import Record
+from lstore.config import SCAN_BATCH_SIZE
+from lstore.stats import instrumented
 
 
 class Query:
@@ -11,11 +13,58 @@ class Query:
         for i in range(self.table.num_columns):
             if projected_columns_index[i] == 1:
                 full[i] = data[i]
+        dictionaries = self.table.dictionaries
+        if len(dictionaries) > 0:
+            for column, dictionary in dictionaries.items():
+                if full[column] is not None:
+                    full[column] = dictionary.decode(full[column])
+            if self.table.key in dictionaries:
+                key = dictionaries[self.table.key].decode(data[self.table.key])
         return Record(rid=rid, key=key, columns=full)
 
+    """
+    String columns are stored as dictionary codes. Values coming in are encoded here,
+    and _project_record decodes them on the way out.
+    """
+    def _encode_row(self, columns, add=True):
+        """
+        Row with strings replaced by their codes; None if a string column gets a non-string.
+        With add=False nothing is added to the dictionaries: a new string becomes -1, a code
+        no record holds, so a row can be checked before its strings are stored for good.
+        """
+        dictionaries = self.table.dictionaries
+        if len(dictionaries) == 0:
+            return columns
+        row = list(columns)
+        for column, dictionary in dictionaries.items():
+            if column >= len(row) or row[column] is None:
+                continue
+            if not isinstance(row[column], str):
+                return None
+            if add:
+                row[column] = dictionary.encode(row[column])
+            else:
+                code = dictionary.lookup(row[column])
+                row[column] = -1 if code is None else code
+        return tuple(row)
+
+    def _encode_value(self, column, value):
+        # Stored form of a predicate value; None if no record can hold it
+        dictionary = self.table.dictionaries.get(column)
+        if dictionary is None:
+            return value
+        if not isinstance(value, str):
+            return None
+        return dictionary.lookup(value)
+
+    def _is_string(self, *columns):
+        return any(column in self.table.dictionaries for column in columns)
+
+    @instrumented("delete")
     def delete(self, primary_key):
         with self.table.latch:
             self.table.apply_pending_merges_foreground()
+            primary_key = self._encode_value(self.table.key, primary_key)
             rid = self.table.index.locate(self.table.key, primary_key)
             if rid is None:
                 return False
@@ -31,6 +80,34 @@ class Query:
                 self.table.index.delete_index(primary_key)
             return success
 
+    def delete_range(self, start_key, end_key):
+        """
+        Delete every record whose primary key lies in [start_key, end_key] under one latch.
+        Index entries and RID cells are removed in bulk, and only the columns that
+        secondary indexes need are read. Returns the number of records deleted, or False
+        on a string primary key, like the other key-range queries.
+        """
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            # Key ranges need ordered keys, which string codes are not
+            if self._is_string(self.table.key):
+                return False
+            rids = self.table.index.locate_range(start_key, end_key, self.table.key)
+            if len(rids) == 0:
+                return 0
+            rows = None
+            columns = self.table.index.columns_for_remove()
+            if len(columns) > 0:
+                # Only the indexed columns are read, page by page
+                rows = [[None] * self.table.num_columns for _ in rids]
+                for column in columns:
+                    for row, value in zip(rows, self.table.read_latest_column(rids, column)):
+                        row[column] = value
+            keys = self.table.index.delete_key_range(start_key, end_key)
+            self.table.index.remove_records(rids, keys, rows)
+            return self.table.delete_base_records(rids)
+
+    @instrumented("insert")
     def insert(self, *columns):
         with self.table.latch:
             self.table.apply_pending_merges_foreground()
@@ -38,11 +115,15 @@ class Query:
                 return False
             if any(col is None for col in columns):
                 return False
-
-            key = columns[self.table.key]
-            if self.table.index.locate(self.table.key, key) is not None:
+            # Strings are only added to the dictionaries once the row passed every check
+            checked = self._encode_row(columns, add=False)
+            if checked is None or not self.table.columns_fit(checked):
+                return False
+            if self.table.index.locate(self.table.key, checked[self.table.key]) is not None:
                 return False
 
+            columns = self._encode_row(columns)
+            key = columns[self.table.key]
             base_rid = self.table.insert_base_record(columns)
             if base_rid is None:
                 return False
@@ -52,6 +133,43 @@ class Query:
             self.table.index.add_record(base_rid, list(columns))
             return True
 
+    def insert_many(self, rows):
+        """
+        Insert a batch of rows with one latch acquisition.
+        The whole batch is validated first: returns False without inserting anything
+        if a row is malformed or a key is duplicated in the batch or in the table.
+        """
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            rows = [tuple(row) for row in rows]
+            key_column = self.table.key
+            for row in rows:
+                if len(row) != self.table.num_columns:
+                    return False
+                if any(col is None for col in row):
+                    return False
+            checked = [self._encode_row(row, add=False) for row in rows]
+            for row in checked:
+                if row is None or not self.table.columns_fit(row):
+                    return False
+            # Strings map to codes one to one, so duplicates are found on the raw keys
+            if len(set(row[key_column] for row in rows)) != len(rows):
+                return False
+            key_index = self.table.index.indices[key_column]
+            if any(row[key_column] in key_index for row in checked):
+                return False
+
+            # The whole batch is valid: only now are new strings added to the dictionaries
+            rows = [self._encode_row(row) for row in rows]
+            keys = [row[key_column] for row in rows]
+            base_rids = self.table.bulk_insert(rows)
+            if base_rids is None:
+                return False
+            self.table.index.insert_keys(keys, base_rids)
+            self.table.index.add_records(base_rids, rows)
+            return True
+
+    @instrumented("select")
     def select(self, search_key, search_key_index, projected_columns_index):
         with self.table.latch:
             self.table.apply_pending_merges_foreground()
@@ -59,6 +177,9 @@ class Query:
                 return False
 
             result = []
+            search_key = self._encode_value(search_key_index, search_key)
+            if search_key is None:
+                return result
 
             if search_key_index == self.table.key:
                 rid = self.table.index.locate(self.table.key, search_key)
@@ -72,16 +193,14 @@ class Query:
             
             #  if Non-key column
             #  see secondary index locate() first
-            #  if not available, fall back to full scan base RIDs
+            #  if not available, fall back to a physical-order scan of the base pages the zone maps cannot rule out
             rid_list = self.table.index.locate(search_key_index, search_key)
             if rid_list is None:
                 rid_list = []
-                for rid in self.table.get_base_rids():
-                    record = self.table.read_latest_record(rid)
-                    if record is None:
-                        continue
-                    if record[4 + search_key_index] == search_key:
-                        rid_list.append(rid)
+                pages = self.table.scan_pruned_base_pages(search_key_index, search_key, search_key)
+                for rids, indirections in pages:
+                    values = self.table.read_latest_column(rids, search_key_index, indirections)
+                    rid_list.extend(rid for rid, value in zip(rids, values) if value == search_key)
 
             for rid in rid_list:
                 record = self.table.read_latest_record(rid)
@@ -91,6 +210,208 @@ class Query:
                 result.append(self._project_record(rid, key, record, projected_columns_index))
             return result
 
+    def select_many(self, search_keys, projected_columns_index, columnar=False):
+        """
+        Multi-get by primary key. All RIDs are located first and read in page order,
+        so each page is pinned once per call.
+        Returns one Record per key in input order (None for a missing key), or with
+        columnar=True one list of values per column (None for unprojected columns).
+        """
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            key_index = self.table.index.indices[self.table.key]
+            key_column = self.table.key
+            rids = [key_index.get(self._encode_value(key_column, key)) for key in search_keys]
+            records = self.table.read_latest_records(rids)
+
+            if columnar:
+                result = [None] * self.table.num_columns
+                for i in range(self.table.num_columns):
+                    if projected_columns_index[i] == 1:
+                        result[i] = [None if record is None else record[4 + i] for record in records]
+                        dictionary = self.table.dictionaries.get(i)
+                        if dictionary is not None:
+                            result[i] = [dictionary.decode(value) for value in result[i]]
+                return result
+
+            result = []
+            for rid, key, record in zip(rids, search_keys, records):
+                if record is None:
+                    result.append(None)
+                else:
+                    result.append(self._project_record(rid, key, record, projected_columns_index))
+            return result
+
+    def scan(self, start_range, end_range, projected_columns_index, batch_size=SCAN_BATCH_SIZE, include_start=True):
+        """
+        Cursor over an inclusive primary-key range, yielding lists of up to batch_size
+        Records in key order. The latch and page pins are held only while a batch is
+        built, so memory stays bounded and writers can run between batches.
+        Closing the generator ends the scan; to resume, scan again from the last key
+        seen with include_start=False.
+        """
+        # Key ranges need ordered keys, which string codes are not
+        if self._is_string(self.table.key):
+            return
+        cursor = start_range
+        include_cursor = include_start
+        while True:
+            with self.table.latch:
+                self.table.apply_pending_merges_foreground()
+                keys = self.table.index.keys_in_range(cursor, end_range, batch_size, include_cursor)
+                if len(keys) == 0:
+                    return
+                key_index = self.table.index.indices[self.table.key]
+                rids = [key_index.get(key) for key in keys]
+                records = self.table.read_latest_records(rids)
+                batch = []
+                for rid, key, record in zip(rids, keys, records):
+                    if record is None:
+                        continue
+                    batch.append(self._project_record(rid, key, record, projected_columns_index))
+            cursor = keys[-1]
+            include_cursor = False
+            if len(batch) > 0:
+                yield batch
+
+    def _locate_column_range(self, start_range, end_range, column):
+        # Use the primary or an ordered secondary index, else scan all base records
+        if self.table.index.is_ordered(column):
+            rids = self.table.index.locate_range(start_range, end_range, column)
+            return rids, self.table.read_latest_records(rids)
+        rids = []
+        records = []
+        base_rids = self.table.prune_base_rids(column, start_range, end_range)
+        for rid, record in zip(base_rids, self.table.read_latest_records(base_rids)):
+            if record is None:
+                continue
+            value = record[4 + column]
+            if start_range <= value <= end_range:
+                rids.append(rid)
+                records.append(record)
+        return rids, records
+
+    def select_range(self, start_range, end_range, search_key_index, projected_columns_index):
+        """
+        Select records whose search_key_index column lies in [start_range, end_range].
+        """
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            if search_key_index < 0 or search_key_index >= self.table.num_columns:
+                return False
+            # Codes follow insertion order, not string order
+            if self._is_string(search_key_index):
+                return False
+            rids, records = self._locate_column_range(start_range, end_range, search_key_index)
+            result = []
+            for rid, record in zip(rids, records):
+                if record is None:
+                    continue
+                key = record[4 + self.table.key]
+                result.append(self._project_record(rid, key, record, projected_columns_index))
+            return result
+
+    def sum_by_column_range(self, start_range, end_range, search_key_index, aggregate_column_index):
+        """
+        Like sum, but the range is over search_key_index instead of the primary key.
+        """
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            if search_key_index < 0 or search_key_index >= self.table.num_columns:
+                return False
+            if self._is_string(search_key_index, aggregate_column_index):
+                return False
+            _, records = self._locate_column_range(start_range, end_range, search_key_index)
+            records = [record for record in records if record is not None]
+            if len(records) == 0:
+                return False
+            total = 0
+            for record in records:
+                total += record[aggregate_column_index + 4]
+            return total
+
+    def select_where(self, predicates, projected_columns_index):
+        """
+        Select records matching every predicate. A predicate is (column, value) for
+        equality or (column, low, high) for an inclusive range.
+        RID sets from all usable indexes are intersected smallest first; the remaining
+        predicates are then checked one column at a time, so a row is dropped as soon
+        as one column fails and its other columns are never read.
+        """
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            equal = {}
+            ranges = {}
+            for predicate in predicates:
+                column = predicate[0]
+                if column < 0 or column >= self.table.num_columns:
+                    return False
+                if len(predicate) == 2:
+                    value = self._encode_value(column, predicate[1])
+                    if value is None:
+                        return []
+                    if column in equal and equal[column] != value:
+                        return []
+                    equal[column] = value
+                elif self._is_string(column):
+                    # Codes follow insertion order, not string order
+                    return False
+                else:
+                    low, high = predicate[1], predicate[2]
+                    if column in ranges:
+                        low = max(low, ranges[column][0])
+                        high = min(high, ranges[column][1])
+                    ranges[column] = (low, high)
+            for column in list(ranges.keys()):
+                low, high = ranges[column]
+                if low > high:
+                    return []
+                if column in equal:
+                    if not (low <= equal[column] <= high):
+                        return []
+                    del ranges[column]
+
+            answered = set()
+            candidates = self.table.index.locate_predicates(equal, ranges)
+            if len(candidates) == 0:
+                # No index: let the zone maps of one predicate column prune pages
+                if len(equal) > 0:
+                    column, value = next(iter(equal.items()))
+                    rids = self.table.prune_base_rids(column, value, value)
+                elif len(ranges) > 0:
+                    column, (low, high) = next(iter(ranges.items()))
+                    rids = self.table.prune_base_rids(column, low, high)
+                else:
+                    rids = self.table.get_base_rids()
+            else:
+                candidates.sort(key=lambda candidate: len(candidate[0]))
+                rid_set = set(candidates[0][0])
+                answered |= candidates[0][1]
+                for other, columns in candidates[1:]:
+                    if len(rid_set) == 0:
+                        break
+                    rid_set.intersection_update(other)
+                    answered |= columns
+                rids = sorted(rid_set)
+
+            # Equality first: it usually rejects the most rows
+            remaining = [(col, value, value) for col, value in equal.items() if col not in answered]
+            remaining += [(col, low, high) for col, (low, high) in ranges.items() if col not in answered]
+            for column, low, high in remaining:
+                if len(rids) == 0:
+                    break
+                values = self.table.read_latest_column(rids, column)
+                rids = [rid for rid, value in zip(rids, values) if value is not None and low <= value <= high]
+
+            result = []
+            for rid, record in zip(rids, self.table.read_latest_records(rids)):
+                if record is None:
+                    continue
+                key = record[4 + self.table.key]
+                result.append(self._project_record(rid, key, record, projected_columns_index))
+            return result
+
+    @instrumented("select_version")
     def select_version(self, search_key, search_key_index, projected_columns_index, relative_version):
         with self.table.latch:
             self.table.apply_pending_merges_foreground()
@@ -99,7 +420,7 @@ class Query:
             if search_key_index != self.table.key:
                 return False
 
-            rid = self.table.index.locate(self.table.key, search_key)
+            rid = self.table.index.locate(self.table.key, self._encode_value(self.table.key, search_key))
             if rid is None:
                 return []
             record = self.table.read_latest_record_modified(rid, relative_version)
@@ -107,9 +428,27 @@ class Query:
                 return []
             return [self._project_record(rid, search_key, record, projected_columns_index)]
 
+    def select_as_of(self, search_key, timestamp, projected_columns_index):
+        """
+        The version of the record with primary key search_key that was current at
+        timestamp (ms since the epoch, as in TIMESTAMP_COLUMN).
+        Returns [] if the key is missing or was inserted after timestamp.
+        """
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            rid = self.table.index.locate(self.table.key, self._encode_value(self.table.key, search_key))
+            if rid is None:
+                return []
+            record = self.table.read_record_as_of(rid, timestamp)
+            if record is None:
+                return []
+            return [self._project_record(rid, search_key, record, projected_columns_index)]
+
+    @instrumented("update")
     def update(self, primary_key, *columns):
         with self.table.latch:
             self.table.apply_pending_merges_foreground()
+            primary_key = self._encode_value(self.table.key, primary_key)
             rid = self.table.index.locate(self.table.key, primary_key)
             if rid is None:
                 return False
@@ -118,11 +457,15 @@ class Query:
             if old_latest is None:
                 return False
 
+            checked = self._encode_row(columns, add=False)
+            if checked is None or not self.table.columns_fit(checked):
+                return False
             key_column = self.table.key
-            new_key = columns[key_column] if key_column < len(columns) else None
+            new_key = checked[key_column] if key_column < len(checked) else None
             if new_key is not None and new_key != primary_key:
                 return False
 
+            columns = self._encode_row(columns)
             tail_rid = self.table.append_tail_record(columns, rid)
             if tail_rid is None:
                 return False
@@ -133,27 +476,175 @@ class Query:
 
             return True
 
+    def update_many(self, updates):
+        """
+        Apply a batch of (primary_key, columns) updates with one latch acquisition.
+        The batch is validated first: returns False without updating anything
+        if a key is missing or an update tries to change the primary key.
+        """
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            key_column = self.table.key
+            batch = []
+            for primary_key, columns in updates:
+                primary_key = self._encode_value(key_column, primary_key)
+                rid = self.table.index.locate(key_column, primary_key)
+                if rid is None:
+                    return False
+                checked = self._encode_row(columns, add=False)
+                if checked is None or not self.table.columns_fit(checked):
+                    return False
+                new_key = checked[key_column] if key_column < len(checked) else None
+                if new_key is not None and new_key != primary_key:
+                    return False
+                batch.append((rid, columns))
+            if len(batch) == 0:
+                return True
+            batch = [(rid, self._encode_row(columns)) for rid, columns in batch]
+
+            rids = list(dict.fromkeys(rid for rid, _ in batch))
+            old_latest = self.table.read_latest_records(rids)
+            if any(record is None for record in old_latest):
+                return False
+            if self.table.bulk_append_tail_records(batch) is None:
+                return False
+            new_latest = self.table.read_latest_records(rids)
+            for rid, old, new in zip(rids, old_latest, new_latest):
+                if new is not None:
+                    self.table.index.update_record(rid, old[4:], new[4:])
+            return True
+
+    @instrumented("sum")
     def sum(self, start_range, end_range, aggregate_column_index):
         with self.table.latch:
             self.table.apply_pending_merges_foreground()
+            if self._is_string(self.table.key, aggregate_column_index):
+                return False
+            if aggregate_column_index in self.table.index.aggregate_indices:
+                if len(self.table.index.keys_in_range(start_range, end_range, 1)) == 0:
+                    return False
+                return self.table.index.range_sum(start_range, end_range, aggregate_column_index)
             rid_list = self.table.index.locate_range(start_range, end_range, self.table.key)
             if len(rid_list) == 0:
                 return False
             total = 0
-            for rid in rid_list:
-                if rid is None:
+            for value in self.table.read_latest_column(rid_list, aggregate_column_index):
+                if value is not None:
+                    total += value
+            return total
+
+    def _rids_in_key_range(self, start_range, end_range):
+        # Base RIDs for keys in [start_range, end_range]; a None bound is open
+        if start_range is None and end_range is None:
+            return self.table.get_base_rids()
+        sorted_keys = self.table.index.sorted_keys
+        if len(sorted_keys) == 0:
+            return []
+        begin = sorted_keys[0] if start_range is None else start_range
+        end = sorted_keys[-1] if end_range is None else end_range
+        return self.table.index.locate_range(begin, end, self.table.key)
+
+    def _column_in_key_range(self, start_range, end_range, column):
+        rid_list = self._rids_in_key_range(start_range, end_range)
+        return [value for value in self.table.read_latest_column(rid_list, column) if value is not None]
+
+    def count(self, start_range=None, end_range=None):
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            if (start_range is not None or end_range is not None) and self._is_string(self.table.key):
+                return False
+            return len(self._column_in_key_range(start_range, end_range, self.table.key))
+
+    def min(self, start_range, end_range, aggregate_column_index):
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            if self._is_string(self.table.key, aggregate_column_index):
+                return False
+            values = self._column_in_key_range(start_range, end_range, aggregate_column_index)
+            if len(values) == 0:
+                return False
+            return min(values)
+
+    def max(self, start_range, end_range, aggregate_column_index):
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            if self._is_string(self.table.key, aggregate_column_index):
+                return False
+            values = self._column_in_key_range(start_range, end_range, aggregate_column_index)
+            if len(values) == 0:
+                return False
+            return max(values)
+
+    def avg(self, start_range, end_range, aggregate_column_index):
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            if self._is_string(self.table.key, aggregate_column_index):
+                return False
+            values = self._column_in_key_range(start_range, end_range, aggregate_column_index)
+            if len(values) == 0:
+                return False
+            return sum(values) / len(values)
+
+    def group_by(self, group_column_index, aggregate, aggregate_column_index=None, start_range=None, end_range=None):
+        """
+        Hash aggregation: {group value: aggregate of aggregate_column_index} over keys in
+        the optional range. aggregate is one of 'count', 'sum', 'min', 'max', 'avg'.
+        Only the two columns involved are read, page by page.
+        """
+        if aggregate not in ('count', 'sum', 'min', 'max', 'avg'):
+            return False
+        if aggregate_column_index is None:
+            if aggregate != 'count':
+                return False
+            aggregate_column_index = group_column_index
+        elif self._is_string(aggregate_column_index):
+            return False
+        if (start_range is not None or end_range is not None) and self._is_string(self.table.key):
+            return False
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            rid_list = self._rids_in_key_range(start_range, end_range)
+            groups = self.table.read_latest_column(rid_list, group_column_index)
+            if aggregate_column_index == group_column_index:
+                values = groups
+            else:
+                values = self.table.read_latest_column(rid_list, aggregate_column_index)
+
+            result = {}
+            counts = {}
+            for group, value in zip(groups, values):
+                if group is None or value is None:
                     continue
-                cur_record = self.table.read_latest_record(rid)
-                if cur_record is None:
+                if group not in result:
+                    counts[group] = 1
+                    result[group] = 1 if aggregate == 'count' else value
                     continue
-                total += cur_record[aggregate_column_index + 4]
-            return total
+                counts[group] += 1
+                if aggregate == 'count':
+                    result[group] += 1
+                elif aggregate == 'sum' or aggregate == 'avg':
+                    result[group] += value
+                elif aggregate == 'min':
+                    if value < result[group]:
+                        result[group] = value
+                elif value > result[group]:
+                    result[group] = value
+            if aggregate == 'avg':
+                for group in result:
+                    result[group] = result[group] / counts[group]
+            dictionary = self.table.dictionaries.get(group_column_index)
+            if dictionary is not None:
+                result = {dictionary.decode(group): value for group, value in result.items()}
+            return result
 
+    @instrumented("sum_version")
     def sum_version(self, start_range, end_range, aggregate_column_index, relative_version):
         with self.table.latch:
             # Apply merges in the foreground while holding the latch so
             # page_directory swaps don't race with reads during this query.
             self.table.apply_pending_merges_foreground()
+            if self._is_string(self.table.key, aggregate_column_index):
+                return False
             rid_list = self.table.index.locate_range(start_range, end_range, self.table.key)
             if len(rid_list) == 0:
                 return False
@@ -166,9 +657,30 @@ class Query:
                 total += cur_record[aggregate_column_index + 4]
             return total
 
+    def sum_as_of(self, start_range, end_range, aggregate_column_index, timestamp):
+        """
+        sum over the versions current at timestamp; records inserted later are left out.
+        """
+        with self.table.latch:
+            self.table.apply_pending_merges_foreground()
+            if self._is_string(self.table.key, aggregate_column_index):
+                return False
+            rid_list = self.table.index.locate_range(start_range, end_range, self.table.key)
+            if len(rid_list) == 0:
+                return False
+            total = 0
+            for rid in rid_list:
+                record = self.table.read_record_as_of(rid, timestamp)
+                if record is None:
+                    continue
+                total += record[aggregate_column_index + 4]
+            return total
+
     def increment(self, key, column):
         with self.table.latch:
             self.table.apply_pending_merges_foreground()
+            if self._is_string(column):
+                return False
             selected = self.select(key, self.table.key, [1] * self.table.num_columns)
             if not selected:
                 return False
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+
+
+class RecordCache:
+    """
+    Bounded LRU cache from base RID to its materialized latest record, so hot keys
+    skip the base + tail page reads. Writers must keep it current through
+    replace() / invalidate(); hit and miss counters are kept for tuning.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.records = OrderedDict()  # base rid -> tuple of the latest record
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, rid):
+        record = self.records.get(rid)
+        if record is None:
+            self.misses += 1
+            return None
+        self.records.move_to_end(rid)
+        self.hits += 1
+        return record
+
+    def put(self, rid, record):
+        if self.capacity <= 0:
+            return
+        self.records[rid] = tuple(record)
+        self.records.move_to_end(rid)
+        while len(self.records) > self.capacity:
+            self.records.popitem(last=False)
+
+    def replace(self, rid, record):
+        # Update in place only when cached, so writes never pull cold records in
+        if rid in self.records:
+            self.records[rid] = tuple(record)
+
+    def invalidate(self, rid):
+        self.records.pop(rid, None)
+
+    def clear(self):
+        self.records.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            "size": len(self.records),
+            "capacity": self.capacity,
+        }
@@ -0,0 +1,216 @@
+"""
+Per-query instrumentation: latency histograms, page pins, cells read and latch waits.
+
+Collection is off by default and is switched at runtime with table.stats.enable().
+While it is off every hook is a single attribute test, so queries pay almost nothing.
+"""
+
+import functools
+import json
+import threading
+from time import perf_counter_ns
+
+# Sub-buckets per power of two; 4 keeps every bucket within 19% of its upper bound
+HISTOGRAM_SUB_BUCKETS = 4
+_SUB_BITS = 2
+
+
+def _bucket_of(ns):
+    # Log-linear bucket: top bits of ns pick the power of two and one of 4 steps inside it
+    if ns < HISTOGRAM_SUB_BUCKETS:
+        return max(0, ns)
+    bits = ns.bit_length()
+    return (bits - _SUB_BITS) * HISTOGRAM_SUB_BUCKETS + ((ns >> (bits - _SUB_BITS - 1)) & (HISTOGRAM_SUB_BUCKETS - 1))
+
+
+def _bucket_upper(bucket):
+    # Largest latency (ns) that lands in bucket
+    if bucket < HISTOGRAM_SUB_BUCKETS:
+        return bucket
+    shift = bucket // HISTOGRAM_SUB_BUCKETS - 1
+    step = bucket % HISTOGRAM_SUB_BUCKETS
+    return ((HISTOGRAM_SUB_BUCKETS + step + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram. Recording is one dict increment; percentiles are
+    the upper bound of the bucket holding that rank, capped at the largest sample.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns):
+        bucket = _bucket_of(ns)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, p):
+        if self.count == 0:
+            return 0
+        rank = max(1, int(-(-self.count * p // 100)))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(_bucket_upper(bucket), self.max_ns)
+        return self.max_ns
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_us": self.total_ns / self.count / 1000 if self.count else 0,
+            "p50_us": self.percentile(50) / 1000,
+            "p99_us": self.percentile(99) / 1000,
+            "p999_us": self.percentile(99.9) / 1000,
+            "max_us": self.max_ns / 1000,
+        }
+
+
+class TimedLatch:
+    """
+    Re-entrant lock that adds the time spent blocked on it to stats.latch_wait_ns.
+    An uncontended acquire takes the fast path and is never timed.
+    """
+
+    def __init__(self, stats):
+        self._lock = threading.RLock()
+        self.stats = stats
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not self.stats.enabled or not blocking:
+            return self._lock.acquire(blocking, timeout)
+        if self._lock.acquire(False):
+            return True
+        start = perf_counter_ns()
+        acquired = self._lock.acquire(True, timeout)
+        self.stats.latch_wait_ns += perf_counter_ns() - start
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+class QueryStats:
+    """
+    Per-table counters and per-operation latency histograms.
+    pages_pinned, cells_read and latch_wait_ns are running totals bumped by the table;
+    each query records how much they moved while it ran. Work done by the merge thread
+    or other transaction threads at the same time is counted against the running query,
+    so per-operation counters are approximate under concurrency.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.trace = None
+        self.pages_pinned = 0
+        self.cells_read = 0
+        self.latch_wait_ns = 0
+        self.operations = {}
+        # Queries from several transaction threads finish concurrently
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def set_trace(self, callback):
+        """
+        callback(event) runs after every instrumented query with a dict holding
+        operation, args, ok, latency_ns, pages_pinned, cells_read and latch_wait_ns.
+        Pass None to remove it.
+        """
+        self.trace = callback
+
+    def reset(self):
+        self.pages_pinned = 0
+        self.cells_read = 0
+        self.latch_wait_ns = 0
+        self.operations = {}
+
+    def begin(self):
+        return (perf_counter_ns(), self.pages_pinned, self.cells_read, self.latch_wait_ns)
+
+    def end(self, operation, token, args, result):
+        latency = perf_counter_ns() - token[0]
+        pinned = self.pages_pinned - token[1]
+        cells = self.cells_read - token[2]
+        waited = self.latch_wait_ns - token[3]
+        with self._lock:
+            op = self.operations.get(operation)
+            if op is None:
+                op = self.operations[operation] = {
+                    "latency": LatencyHistogram(), "pages_pinned": 0, "cells_read": 0, "latch_wait_ns": 0}
+            op["latency"].record(latency)
+            op["pages_pinned"] += pinned
+            op["cells_read"] += cells
+            op["latch_wait_ns"] += waited
+        if self.trace is not None:
+            self.trace({
+                "operation": operation,
+                "args": args,
+                "ok": result is not False,
+                "latency_ns": latency,
+                "pages_pinned": pinned,
+                "cells_read": cells,
+                "latch_wait_ns": waited,
+            })
+
+    def to_dict(self):
+        result = {}
+        with self._lock:
+            operations = list(self.operations.items())
+        for operation, op in operations:
+            entry = op["latency"].to_dict()
+            count = max(1, entry["count"])
+            entry["pages_pinned"] = op["pages_pinned"]
+            entry["cells_read"] = op["cells_read"]
+            entry["pages_pinned_per_op"] = op["pages_pinned"] / count
+            entry["cells_read_per_op"] = op["cells_read"] / count
+            entry["latch_wait_us"] = op["latch_wait_ns"] / 1000
+            result[operation] = entry
+        return {
+            "enabled": self.enabled,
+            "operations": result,
+            "pages_pinned": self.pages_pinned,
+            "cells_read": self.cells_read,
+            "latch_wait_us": self.latch_wait_ns / 1000,
+        }
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), indent=indent)
+
+
+def instrumented(operation):
+    """
+    Decorator for Query methods: records latency and counter deltas in table.stats
+    when collection is enabled, otherwise calls straight through.
+    """
+    def wrap(method):
+        @functools.wraps(method)
+        def run(self, *args, **kwargs):
+            stats = self.table.stats
+            if not stats.enabled:
+                return method(self, *args, **kwargs)
+            token = stats.begin()
+            result = method(self, *args, **kwargs)
+            stats.end(operation, token, args, result)
+            return result
+        return run
+    return wrap
@@ -1,10 +1,19 @@
 from lstore.index import Index
+from lstore.record_cache import RecordCache
+from lstore.dictionary import StringDictionary
 from time import time
-from lstore.config import PAGE_SIZE, BASE_PAGES_PER_RANGE, MERGE_TAIL_PAGE_THRESHOLD
+from lstore.config import PAGE_SIZE, BASE_PAGES_PER_RANGE, MERGE_TAIL_PAGE_THRESHOLD, RECORD_CACHE_SIZE
+from lstore.config import SPARSE_TAIL_CUMULATIVE_INTERVAL, TAIL_GC_KEEP_VERSIONS, TAIL_TS_INDEX_INTERVAL
+from lstore.config import COMPRESS_MERGED_PAGES, COMPACTION_FILL_THRESHOLD, COMPACTION_DELETE_THRESHOLD
+from lstore.config import QUERY_STATS_ENABLED
+from lstore.compression import EncodedPage, encode_page
+from lstore.stats import QueryStats, TimedLatch
 import time
 import os
 import threading
 import struct
+import json
+from bisect import bisect_right
 
 INDIRECTION_COLUMN = 0
 RID_COLUMN = 1
@@ -13,6 +22,22 @@ SCHEMA_ENCODING_COLUMN = 3
 INT_SIZE = 8
 RECORDS_PER_PAGE = PAGE_SIZE // INT_SIZE
 
+# Tail storage modes
+# cumulative: every tail record stores the full row
+# sparse: a tail record stores only the columns its update set, plus a full row
+#         every SPARSE_TAIL_CUMULATIVE_INTERVAL records so reads stay bounded
+# row: full rows like cumulative, but each record sits contiguously in one row page
+#      (one extra tail column), so an append pins one page instead of one per column
+TAIL_CUMULATIVE = "cumulative"
+TAIL_SPARSE = "sparse"
+TAIL_ROW = "row"
+
+# Column types: name -> struct code. Metadata columns and row tail pages are always int64
+# string columns store int32 codes into the column's StringDictionary
+STRING_COLUMN_TYPE = "string"
+COLUMN_TYPES = {"int8": "b", "int16": "h", "int32": "i", "int64": "q", STRING_COLUMN_TYPE: "i"}
+DEFAULT_COLUMN_TYPE = "int64"
+
 class Record:
 
     def __init__(self, rid, key, columns):
@@ -26,11 +51,25 @@ class Table:
     :param name: string         #Table name
     :param num_columns: int     #Number of Columns: all columns are integer
     :param key: int             #Index of table key in columns
+    :param tail_storage: string #TAIL_CUMULATIVE, TAIL_SPARSE or TAIL_ROW
+    :param column_types: list   #One COLUMN_TYPES name per column, int64 if None
     """
-    def __init__(self, name, num_columns, key):
+    def __init__(self, name, num_columns, key, tail_storage=TAIL_CUMULATIVE, column_types=None):
         self.name = name
         self.key = key
         self.num_columns = num_columns
+        self.tail_storage = tail_storage
+        if column_types is None:
+            column_types = [DEFAULT_COLUMN_TYPE] * num_columns
+        if len(column_types) != num_columns or any(t not in COLUMN_TYPES for t in column_types):
+            raise ValueError("column_types needs one of " + ", ".join(COLUMN_TYPES) + " per column")
+        self.column_types = list(column_types)
+        # column -> StringDictionary for each string column (saved in string_dictionaries.txt)
+        self.dictionaries = {
+            column: StringDictionary() for column, t in enumerate(self.column_types) if t == STRING_COLUMN_TYPE
+        }
+        # sparse mode: base rid -> tail records written since the last full one (not persisted)
+        self._sparse_depth = {}
 
         """
         page_directory is a dictionary. The key is the rid, and
@@ -41,10 +80,20 @@ class Table:
         self.merge_tail_page_threshold = MERGE_TAIL_PAGE_THRESHOLD
         
         self.total_columns = num_columns + 4 # first 4 col is for metadata
+        # Row-mode tail pages are stored as one more tail column after the real ones
+        self.row_column = self.total_columns
+        self.tail_columns = self.total_columns + 1 if tail_storage == TAIL_ROW else self.total_columns
+        # Cell layout per physical column (metadata, data, then the row column): a page
+        # holds PAGE_SIZE // width cells, so narrow columns fit more rows per page
+        codes = ["q"] * 4 + [COLUMN_TYPES[t] for t in self.column_types] + ["q"]
+        self._cell_codes = codes
+        self._cell_structs = [struct.Struct(">" + code) for code in codes]
+        self._cell_widths = [struct.calcsize(code) for code in codes]
+        self.cells_per_page = [PAGE_SIZE // width for width in self._cell_widths]
         # only tracking page slots 
         # physical page bytes are managed by bufferpool/disk
         self.base_pages = [[None] for _ in range(self.total_columns)]
-        self.tail_pages = [[None] for _ in range(self.total_columns)]
+        self.tail_pages = [[None] for _ in range(self.tail_columns)]
 
         # tracking the special tail record with SE* when first time update the column
         self.star_tail_record = set()
@@ -59,21 +108,61 @@ class Table:
         self.base_rids = set()
         self._sorted_base_rids_cache = None
         # each list stores global tail page indices
-        self.tail_range_pages = {0: [[0] for _ in range(self.total_columns)]}
+        self.tail_range_pages = {0: [[0] for _ in range(self.tail_columns)]}
 
-        self.current_base_page_index = []
-        self.current_tail_page_index = []
-        for i in range(self.total_columns):
-            self.current_base_page_index.append(0)
-            self.current_tail_page_index.append(0)
+        self.current_base_page_index = [0] * self.total_columns
+        self.current_tail_page_index = [0] * self.tail_columns
         self.bufferpool = None
         self.disk_manager = None
-        self.latch = threading.RLock()
+        # Latency histograms and pin/cell/latch counters, see lstore/stats.py
+        self.stats = QueryStats(QUERY_STATS_ENABLED)
+        self.latch = TimedLatch(self.stats)
+        # Held for a whole merge pass, so tail GC never removes a tail a merge is reading
+        self._merge_lock = threading.Lock()
         self._tail_pages_created_since_merge = 0
         self._merge_request = threading.Event()
         self._merge_stop = threading.Event()
         self._pending_merge_jobs = []
         self._merge_thread = None
+        # Base page compaction, run by the merge thread after enough deletes
+        self._compaction_request = threading.Event()
+        self._deletes_since_compaction = 0
+        # (column, page index) of base pages freed by compaction; their slots are never reused
+        self.freed_base_pages = set()
+
+        # Zone maps: [min, max] of data values, widened by writes and made exact again by merges.
+        # (column, page_index) -> base page values
+        # (range_index, column) -> all latest values in the range / values in its unmerged tails
+        self.page_zone_maps = {}
+        self.range_zone_maps = {}
+        self.tail_zone_maps = {}
+        # range_index -> [(range zones, tail zones)] of merges not installed yet;
+        # writes after a merge's snapshot widen these so the install can add them back
+        self._zone_trackers = {}
+
+        # base rid -> latest record, kept current by every write path
+        self.record_cache = RecordCache(RECORD_CACHE_SIZE)
+
+        # Sparse timestamp index over tail appends, one sample every TAIL_TS_INDEX_INTERVAL:
+        # range index -> ([timestamp], [tail rid]) in append order
+        self.tail_ts_index = {}
+        self._tail_ts_counts = {}
+
+        # base rid -> its version chain, oldest (floor) to newest tail rid; built lazily
+        # from indirection cells and extended when new tails show up (not persisted)
+        self._version_chains = {}
+
+    def columns_fit(self, columns):
+        """
+        True if every non-None value fits the type of its column.
+        """
+        for column_type, value in zip(self.column_types, columns):
+            if value is None or column_type == DEFAULT_COLUMN_TYPE:
+                continue
+            bits = struct.calcsize(COLUMN_TYPES[column_type]) * 8
+            if value < -(1 << (bits - 1)) or value >= 1 << (bits - 1):
+                return False
+        return True
 
     def bind_storage(self, bufferpool, disk_manager):
         self.bufferpool = bufferpool
@@ -82,6 +171,8 @@ class Table:
     def _fetch_frame(self, is_tail, column, page_index, pin=True):
         if self.bufferpool is None:
             return None
+        if pin and self.stats.enabled:
+            self.stats.pages_pinned += 1
         return self.bufferpool.fetch_page(self.name, is_tail, column, page_index, pin=pin)
 
     def _unpin(self, is_tail, column, page_index):
@@ -96,57 +187,200 @@ class Table:
         try:
             if offset is None or offset < 0 or offset >= frame.num_records:
                 return None
-            return struct.unpack_from(">q", frame.data, offset * INT_SIZE)[0]
+            if self.stats.enabled:
+                self.stats.cells_read += 1
+            if frame.encoded is not None:
+                return frame.encoded.get(offset)
+            return self._cell_structs[column].unpack_from(frame.data, offset * self._cell_widths[column])[0]
         finally:
             self._unpin(is_tail, column, page_index)
 
+    def _writable(self, frame, column):
+        # A write to a compressed page turns it back into a plain page first
+        if frame.encoded is not None:
+            values = frame.encoded.values()
+            frame.data = bytearray(PAGE_SIZE)
+            struct.pack_into(">%d%s" % (len(values), self._cell_codes[column]), frame.data, 0, *values)
+            frame.encoded = None
+        elif len(frame.data) < PAGE_SIZE:
+            frame.data.extend(bytearray(PAGE_SIZE - len(frame.data)))
+
     def _append_cell(self, is_tail, column, page_index, value):
         frame = self._fetch_frame(is_tail, column, page_index, pin=True)
         if frame is None:
             return None
         try:
-            if len(frame.data) < PAGE_SIZE:
-                frame.data.extend(bytearray(PAGE_SIZE - len(frame.data)))
-            if frame.num_records >= RECORDS_PER_PAGE:
+            self._writable(frame, column)
+            if frame.num_records >= self.cells_per_page[column]:
                 return None
             offset = frame.num_records
+            width = self._cell_widths[column]
             if value is None:
-                frame.data[offset * INT_SIZE: offset * INT_SIZE + INT_SIZE] = bytearray(INT_SIZE)
+                frame.data[offset * width: offset * width + width] = bytearray(width)
             else:
-                struct.pack_into(">q", frame.data, offset * INT_SIZE, value)
+                self._cell_structs[column].pack_into(frame.data, offset * width, value)
             frame.num_records += 1
             self.bufferpool.mark_dirty(self.name, is_tail, column, page_index)
             return offset
         finally:
             self._unpin(is_tail, column, page_index)
 
+    def _append_cells(self, is_tail, column, page_index, values, start=0):
+        """
+        Append values[start:] to one page under a single pin, as many as fit.
+        Returns (first offset, count written) or None if the page cannot be fetched.
+        """
+        frame = self._fetch_frame(is_tail, column, page_index, pin=True)
+        if frame is None:
+            return None
+        try:
+            self._writable(frame, column)
+            offset = frame.num_records
+            count = min(self.cells_per_page[column] - offset, len(values) - start)
+            if count <= 0:
+                return offset, 0
+            chunk = [0 if v is None else v for v in values[start:start + count]]
+            code = self._cell_codes[column]
+            struct.pack_into(">%d%s" % (count, code), frame.data, offset * self._cell_widths[column], *chunk)
+            frame.num_records += count
+            self.bufferpool.mark_dirty(self.name, is_tail, column, page_index)
+            return offset, count
+        finally:
+            self._unpin(is_tail, column, page_index)
+
     def _update_cell(self, is_tail, column, page_index, offset, value):
         frame = self._fetch_frame(is_tail, column, page_index, pin=True)
         if frame is None:
             return False
         try:
-            if len(frame.data) < PAGE_SIZE:
-                frame.data.extend(bytearray(PAGE_SIZE - len(frame.data)))
+            self._writable(frame, column)
             if offset is None or offset < 0 or offset >= frame.num_records:
                 return False
+            width = self._cell_widths[column]
             if value is None:
-                frame.data[offset * INT_SIZE: offset * INT_SIZE + INT_SIZE] = bytearray(INT_SIZE)
+                frame.data[offset * width: offset * width + width] = bytearray(width)
             else:
-                struct.pack_into(">q", frame.data, offset * INT_SIZE, value)
+                self._cell_structs[column].pack_into(frame.data, offset * width, value)
+            self.bufferpool.mark_dirty(self.name, is_tail, column, page_index)
+            return True
+        finally:
+            self._unpin(is_tail, column, page_index)
+
+    def _read_page_cells(self, is_tail, column, page_index, offsets):
+        """
+        Read several cells of one page under a single pin.
+        """
+        frame = self._fetch_frame(is_tail, column, page_index, pin=True)
+        if frame is None:
+            return [None] * len(offsets)
+        try:
+            if self.stats.enabled:
+                self.stats.cells_read += len(offsets)
+            values = []
+            cell = self._cell_structs[column]
+            width = self._cell_widths[column]
+            decoded = None
+            if frame.encoded is not None and len(offsets) > 8:
+                # Many cells: one decode of the page is cheaper than per-cell reads
+                decoded = frame.encoded.values()
+            for offset in offsets:
+                if offset is None or offset < 0 or offset >= frame.num_records:
+                    values.append(None)
+                elif decoded is not None:
+                    values.append(decoded[offset])
+                elif frame.encoded is not None:
+                    values.append(frame.encoded.get(offset))
+                else:
+                    values.append(cell.unpack_from(frame.data, offset * width)[0])
+            return values
+        finally:
+            self._unpin(is_tail, column, page_index)
+
+    def _read_page_values(self, is_tail, column, page_index):
+        """
+        Every written cell of one page, in offset order, under a single pin.
+        """
+        frame = self._fetch_frame(is_tail, column, page_index, pin=True)
+        if frame is None:
+            return []
+        try:
+            if self.stats.enabled:
+                self.stats.cells_read += frame.num_records
+            if frame.encoded is not None:
+                return frame.encoded.values()
+            count = frame.num_records
+            return list(struct.unpack_from(">%d%s" % (count, self._cell_codes[column]), frame.data, 0))
+        finally:
+            self._unpin(is_tail, column, page_index)
+
+    def _update_page_cells(self, is_tail, column, page_index, cells):
+        """
+        Overwrite several (offset, value) cells of one page under a single pin.
+        """
+        frame = self._fetch_frame(is_tail, column, page_index, pin=True)
+        if frame is None:
+            return False
+        try:
+            self._writable(frame, column)
+            cell = self._cell_structs[column]
+            width = self._cell_widths[column]
+            for offset, value in cells:
+                if offset is None or offset < 0 or offset >= frame.num_records:
+                    continue
+                cell.pack_into(frame.data, offset * width, 0 if value is None else value)
             self.bufferpool.mark_dirty(self.name, is_tail, column, page_index)
             return True
         finally:
             self._unpin(is_tail, column, page_index)
 
-    def _page_has_capacity(self, is_tail, column, page_index):
+    def _page_has_capacity(self, is_tail, column, page_index, cells=1):
         frame = self._fetch_frame(is_tail, column, page_index, pin=True)
         if frame is None:
             return False
         try:
-            return frame.num_records < RECORDS_PER_PAGE
+            return frame.num_records + cells <= self.cells_per_page[column]
         finally:
             self._unpin(is_tail, column, page_index)
 
+    def _compress_base_page(self, column, page_index):
+        """
+        Re-encode a finished merged base page with its smallest encoding (see lstore.compression).
+        Pages that would not shrink stay plain. Returns True if the page is now compressed.
+        """
+        frame = self._fetch_frame(False, column, page_index, pin=True)
+        if frame is None:
+            return False
+        try:
+            if frame.encoded is not None:
+                return True
+            count = frame.num_records
+            code = self._cell_codes[column]
+            values = list(struct.unpack_from(">%d%s" % (count, code), frame.data, 0))
+            payload = encode_page(values, self._cell_widths[column])
+            if payload is None:
+                return False
+            frame.encoded = EncodedPage(payload)
+            frame.data = frame.encoded.data
+            self.bufferpool.mark_dirty(self.name, False, column, page_index)
+            return True
+        finally:
+            self._unpin(False, column, page_index)
+
+    def _base_page_matches(self, column, page_index, low, high):
+        """
+        Offsets of a compressed base page whose value lies in [low, high],
+        evaluated without decoding the page. None for a plain page.
+        """
+        frame = self._fetch_frame(False, column, page_index, pin=True)
+        if frame is None:
+            return None
+        try:
+            if frame.encoded is None:
+                return None
+            return set(frame.encoded.match(low, high))
+        finally:
+            self._unpin(False, column, page_index)
+
     def _base_range_from_page_index(self, page_index):
         return page_index // self.base_pages_per_range
 
@@ -163,31 +397,35 @@ class Table:
 
     def _ensure_tail_range(self, range_index):
         if range_index not in self.tail_range_pages:
-            self.tail_range_pages[range_index] = [[] for _ in range(self.total_columns)]
+            self.tail_range_pages[range_index] = [[] for _ in range(self.tail_columns)]
 
     def _register_existing_tail_pages(self, range_to_pages):
         self.tail_range_pages = {}
         if not range_to_pages:
-            self.tail_range_pages[0] = [[0] for _ in range(self.total_columns)]
+            self.tail_range_pages[0] = [[0] for _ in range(self.tail_columns)]
             self._tail_pages_created_since_merge = 0
             return
-        for range_index, pages in range_to_pages.items():
-            sorted_pages = sorted(pages)
-            self.tail_range_pages[range_index] = [list(sorted_pages) for _ in range(self.total_columns)]
+        for range_index, column_pages in range_to_pages.items():
+            self.tail_range_pages[range_index] = [
+                sorted(column_pages.get(col, ())) for col in range(self.tail_columns)
+            ]
         self._tail_pages_created_since_merge = 0
 
     def _on_new_tail_page(self, column):
-        if column != RID_COLUMN:
+        if column != RID_COLUMN and column != self.row_column:
             return
         self._tail_pages_created_since_merge += 1
         if self._tail_pages_created_since_merge >= self.merge_tail_page_threshold:
-            if self._merge_thread is None:
-                self._merge_stop.clear()
-                self._merge_thread = threading.Thread(target=self._merge_worker, daemon=True)
-                self._merge_thread.start()
+            self._start_merge_thread()
             self._merge_request.set()
 
-    def _get_or_allocate_tail_page(self, range_index, column):
+    def _start_merge_thread(self):
+        if self._merge_thread is None:
+            self._merge_stop.clear()
+            self._merge_thread = threading.Thread(target=self._merge_worker, daemon=True)
+            self._merge_thread.start()
+
+    def _get_or_allocate_tail_page(self, range_index, column, cells=1):
         self._ensure_tail_range(range_index)
         pages = self.tail_range_pages[range_index][column]
         if len(pages) == 0:
@@ -198,7 +436,7 @@ class Table:
             self._on_new_tail_page(column)
             return page_index
         page_index = pages[-1]
-        if self._page_has_capacity(True, column, page_index):
+        if self._page_has_capacity(True, column, page_index, cells):
             self.current_tail_page_index[column] = page_index
             return page_index
         page_index = len(self.tail_pages[column])
@@ -208,6 +446,28 @@ class Table:
         self._on_new_tail_page(column)
         return page_index
 
+    def _tail_cell_column(self, entry):
+        # Physical tail column holding a directory entry's cell
+        return self.row_column if entry[0] == 'R' else entry[1]
+
+    def _append_row_tail_record(self, range_index, values):
+        """
+        Row mode: write a whole tail record into one row page with a single pin.
+        Returns its directory: 'R' entries point at the record's cells, None values get 'N'.
+        """
+        page_index = self._get_or_allocate_tail_page(range_index, self.row_column, self.total_columns)
+        written = self._append_cells(True, self.row_column, page_index, values)
+        if written is None or written[1] != self.total_columns:
+            return None
+        offset = written[0]
+        directory = []
+        for i in range(self.total_columns):
+            if values[i] is None:
+                directory.append(('N', i, range_index, page_index, None))
+            else:
+                directory.append(('R', i, range_index, page_index, offset + i))
+        return directory
+
     def _read_record_from_directory(self, direction, is_tail):
         record = []
         for i in range(len(direction)):
@@ -219,26 +479,217 @@ class Table:
             record.append(value)
         return record
 
-    def _materialize_latest_from_snapshot(self, base_direction, snapshot_tail_rid):
+    def _fill_from_older_tails(self, record, tps=None):
+        """
+        Sparse tail records hold only the columns they updated: fill the gaps from the
+        older records of the chain. With tps, stop where the chain is already merged.
+        The walk ends at the latest full record, at most SPARSE_TAIL_CUMULATIVE_INTERVAL steps.
+        """
+        prev_rid = record[INDIRECTION_COLUMN]
+        while self.is_rid_tail_helper(prev_rid) and any(v is None for v in record[4:]):
+            if tps is not None and prev_rid >= tps:
+                break
+            older = self.read_record(prev_rid)
+            if older is None:
+                break
+            for i in range(4, self.total_columns):
+                if record[i] is None:
+                    record[i] = older[i]
+            prev_rid = older[INDIRECTION_COLUMN]
+        return record
+
+    def _materialize_latest_from_snapshot(self, base_direction, snapshot_tail_rid, base_rid=None):
         base_record = self._read_record_from_directory(base_direction, is_tail=False)
         if snapshot_tail_rid is None or not self.is_rid_tail_helper(snapshot_tail_rid):
             return base_record
         tail_record = self.read_record(snapshot_tail_rid)
         if tail_record is None:
             return base_record
+        if self.tail_storage == TAIL_SPARSE:
+            self._fill_from_older_tails(tail_record, self.tps.get(base_rid))
         latest = list(tail_record)
         for i in range(len(latest)):
             if latest[i] is None:
                 latest[i] = base_record[i]
         return latest
 
+    @staticmethod
+    def _widen_zone(zones, zone_key, low, high):
+        if low is None:
+            return
+        zone = zones.get(zone_key)
+        if zone is None:
+            zones[zone_key] = [low, high]
+            return
+        if low < zone[0]:
+            zone[0] = low
+        if high > zone[1]:
+            zone[1] = high
+
+    def _widen_range_zone(self, range_index, column, low, high):
+        self._widen_zone(self.range_zone_maps, (range_index, column), low, high)
+        trackers = self._zone_trackers.get(range_index)
+        if trackers is not None:
+            for range_zones, _tail_zones in trackers:
+                self._widen_zone(range_zones, column, low, high)
+
+    def _widen_tail_zones(self, range_index, values):
+        # values is the physical tail record; only data columns are summarised
+        trackers = self._zone_trackers.get(range_index)
+        for i in range(4, self.total_columns):
+            value = values[i]
+            if value is None:
+                continue
+            self._widen_zone(self.tail_zone_maps, (range_index, i), value, value)
+            self._widen_zone(self.range_zone_maps, (range_index, i), value, value)
+            if trackers is not None:
+                for range_zones, tail_zones in trackers:
+                    self._widen_zone(range_zones, i, value, value)
+                    self._widen_zone(tail_zones, i, value, value)
+
+    def _note_tail_timestamp(self, range_index, tail_rid, timestamp):
+        count = self._tail_ts_counts.get(range_index, 0)
+        self._tail_ts_counts[range_index] = count + 1
+        if count % TAIL_TS_INDEX_INTERVAL != 0 or timestamp is None:
+            return
+        timestamps, rids = self.tail_ts_index.setdefault(range_index, ([], []))
+        # Keep samples sorted even if the clock steps back
+        if len(timestamps) > 0 and timestamp < timestamps[-1]:
+            timestamp = timestamps[-1]
+        timestamps.append(timestamp)
+        rids.append(tail_rid)
+
+    def _tail_rid_bounds(self, range_index, timestamp):
+        """
+        Tails are appended in timestamp order, so the samples around timestamp split the
+        range's tails: rid <= newer_than were written after it, rid >= older_than at or before it.
+        """
+        samples = self.tail_ts_index.get(range_index)
+        if samples is None:
+            return None, None
+        timestamps, rids = samples
+        i = bisect_right(timestamps, timestamp)
+        newer_than = rids[i] if i < len(rids) else None
+        older_than = rids[i - 1] if i > 0 else None
+        return newer_than, older_than
+
+    def _install_range_zones(self, range_index, range_zones, tracker):
+        """
+        Range and tail summaries after a merge of one range: the merge's own [min, max]
+        plus whatever writes widened since its snapshot, so the summaries shrink back
+        to the live values. A merge that could not write every row keeps the current ones.
+        """
+        trackers = self._zone_trackers.get(range_index, [])
+        for i in range(len(trackers)):
+            if trackers[i] is tracker:
+                del trackers[i]
+                break
+        if len(trackers) == 0:
+            self._zone_trackers.pop(range_index, None)
+        if range_zones is None:
+            return
+        since_range, since_tail = tracker
+        for page_col in range(4, self.total_columns):
+            zone = range_zones.get(page_col)
+            zone = None if zone is None else list(zone)
+            since = since_range.get(page_col)
+            if since is not None:
+                zone = list(since) if zone is None else [min(zone[0], since[0]), max(zone[1], since[1])]
+            if zone is None:
+                self.range_zone_maps.pop((range_index, page_col), None)
+            else:
+                self.range_zone_maps[(range_index, page_col)] = zone
+            # Tails up to the snapshot are merged; only newer ones stay unmerged
+            tail_zone = since_tail.get(page_col)
+            if tail_zone is None:
+                self.tail_zone_maps.pop((range_index, page_col), None)
+            else:
+                self.tail_zone_maps[(range_index, page_col)] = list(tail_zone)
+
+    def scan_base_pages(self):
+        """
+        Physical-order scan of live base records: walks the base pages of the RID column
+        in order and yields (rids, latest tail rids) for the live slots of each page
+        (deleted slots hold 0; None when never updated). Metadata columns share page and
+        offset, so the indirection page is read alongside without directory lookups.
+        Pass the tail rids to read_latest_column to resolve a whole page at once.
+        """
+        for page_index in range(len(self.base_pages[RID_COLUMN])):
+            if (RID_COLUMN, page_index) in self.freed_base_pages:
+                continue
+            rid_values = self._read_page_values(False, RID_COLUMN, page_index)
+            indirection_values = self._read_page_values(False, INDIRECTION_COLUMN, page_index)
+            rids = []
+            indirections = []
+            for rid, indirection in zip(rid_values, indirection_values):
+                if rid > 0 and rid in self.base_rids:
+                    rids.append(rid)
+                    indirections.append(indirection if indirection < 0 else None)
+            if len(rids) > 0:
+                yield rids, indirections
+
+    def prune_base_rids(self, column, low, high):
+        """
+        Live base RIDs whose latest value of column may lie in [low, high].
+        """
+        return [rid for rids, _ in self.scan_pruned_base_pages(column, low, high) for rid in rids]
+
+    def scan_pruned_base_pages(self, column, low, high):
+        """
+        scan_base_pages, leaving out records whose latest value of column cannot lie in [low, high].
+        Ranges whose summary misses the interval are skipped whole; inside a range,
+        a base page is skipped when neither its summary nor the range's unmerged
+        tail summary overlaps, and a compressed base page drops the records its
+        encoded values rule out. Missing summaries never prune.
+        """
+        page_col = column + 4
+        range_checks = {}
+        page_checks = {}
+        for page_rids, page_indirections in self.scan_base_pages():
+            rids = []
+            indirections = []
+            for rid, indirection in zip(page_rids, page_indirections):
+                direction = self.page_directory[rid]
+                range_index = direction[RID_COLUMN][2]
+                check = range_checks.get(range_index)
+                if check is None:
+                    zone = self.range_zone_maps.get((range_index, page_col))
+                    tail_zone = self.tail_zone_maps.get((range_index, page_col))
+                    in_range = zone is None or (zone[0] <= high and low <= zone[1])
+                    in_tail = tail_zone is not None and tail_zone[0] <= high and low <= tail_zone[1]
+                    check = (in_range, in_tail)
+                    range_checks[range_index] = check
+                if not check[0]:
+                    continue
+                if not check[1]:
+                    page_index = direction[page_col][3]
+                    keep = page_checks.get(page_index)
+                    if keep is None:
+                        zone = self.page_zone_maps.get((page_col, page_index))
+                        keep = zone is None or (zone[0] <= high and low <= zone[1])
+                        if keep:
+                            # A compressed page answers the predicate on its encoded values
+                            matches = self._base_page_matches(page_col, page_index, low, high)
+                            keep = True if matches is None else matches
+                        page_checks[page_index] = keep
+                    if keep is False:
+                        continue
+                    if keep is not True and direction[page_col][4] not in keep:
+                        continue
+                rids.append(rid)
+                indirections.append(indirection)
+            if len(rids) > 0:
+                yield rids, indirections
+
     def _reclaim_old_base_pages(self, old_pages_by_col):
         if self.bufferpool is None or self.disk_manager is None:
             return
         for col, pages in old_pages_by_col.items():
             for page_index in pages:
+                self.page_zone_maps.pop((col, page_index), None)
                 self.bufferpool.discard_page(self.name, False, col, page_index, flush=False)
                 self.disk_manager.delete_page(self.name, False, col, page_index)
+                self.freed_base_pages.add((col, page_index))
         
      # We define the Rid for base page is positive, rid for tail page is negative
      # rid 0 means null or have been deleted
@@ -260,17 +711,81 @@ class Table:
             offset = self._append_cell(False, i, page_index, value)
             if offset is None:
                 return None
-            range_index = self._base_range_from_page_index(page_index)
+            # Data pages of narrow columns fill at a different rate, so the record's
+            # range always comes from its (int64) metadata pages
+            range_index = self._base_range_from_page_index(page_index) if i < 4 else directory[RID_COLUMN][2]
             mark = 'B'
             if i == INDIRECTION_COLUMN and metadata_columns[i] is None:
                 mark = 'N'
             # Page B_x_y_z, offset is the z-th Base page for column x in page range y
             directory.append((mark, i, range_index, page_index, offset))
+            if i >= 4:
+                self._widen_zone(self.page_zone_maps, (i, page_index), value, value)
+                self._widen_range_zone(range_index, i, value, value)
         self.page_directory[base_rid] = directory
         self.base_rids.add(base_rid)
         self._sorted_base_rids_cache = None
         return base_rid
     
+    def bulk_insert(self, rows):
+        """
+        Insert many base records column-at-a-time with one RID block.
+        Each base page is pinned once per batch instead of once per cell.
+        Returns the new base RIDs in row order, or None if a page write fails.
+        """
+        count = len(rows)
+        if count == 0:
+            return []
+        first_rid = self.next_base_rid
+        self.next_base_rid += count
+        rids = list(range(first_rid, first_rid + count))
+        timestamp = int(time.time() * 1000)
+        directories = [[] for _ in range(count)]
+        for i in range(self.total_columns):
+            if i == INDIRECTION_COLUMN:
+                values = [None] * count
+            elif i == RID_COLUMN:
+                values = rids
+            elif i == TIMESTAMP_COLUMN:
+                values = [timestamp] * count
+            elif i == SCHEMA_ENCODING_COLUMN:
+                values = [0] * count
+            else:
+                values = [row[i - 4] for row in rows]
+            mark = 'N' if i == INDIRECTION_COLUMN else 'B'
+            written = 0
+            while written < count:
+                page_index = self.current_base_page_index[i]
+                result = self._append_cells(False, i, page_index, values, written)
+                if result is None:
+                    return None
+                offset, n = result
+                if n == 0:
+                    self.allocate_new_page(column_index=i, is_tail=False)
+                    continue
+                if i < 4:
+                    range_index = self._base_range_from_page_index(page_index)
+                    for j in range(n):
+                        directories[written + j].append((mark, i, range_index, page_index, offset + j))
+                else:
+                    # A narrow data page can span several ranges of the metadata pages
+                    chunk = values[written:written + n]
+                    self._widen_zone(self.page_zone_maps, (i, page_index), min(chunk), max(chunk))
+                    range_values = {}
+                    for j in range(n):
+                        directory = directories[written + j]
+                        range_index = directory[RID_COLUMN][2]
+                        directory.append((mark, i, range_index, page_index, offset + j))
+                        range_values.setdefault(range_index, []).append(chunk[j])
+                    for range_index, range_chunk in range_values.items():
+                        self._widen_range_zone(range_index, i, min(range_chunk), max(range_chunk))
+                written += n
+        for rid, directory in zip(rids, directories):
+            self.page_directory[rid] = directory
+        self.base_rids.update(rids)
+        self._sorted_base_rids_cache = None
+        return rids
+
     """
     Helper function to write a new tail record if a value is first updated
     """
@@ -286,6 +801,13 @@ class Table:
         # even after merged base pages are refreshed in background.
         write_column = list(base_column)
         metadata_columns = (indirection, cur_tail_rid, timestamp, schema_encoding)
+        if self.tail_storage == TAIL_ROW:
+            directory = self._append_row_tail_record(base_range_index, list(metadata_columns) + write_column)
+            if directory is None:
+                return None
+            self.page_directory[cur_tail_rid] = directory
+            self.star_tail_record.add(cur_tail_rid)
+            return cur_tail_rid
         directory = []
         for i in range(self.total_columns):
             page_index = self._get_or_allocate_tail_page(base_range_index, i)
@@ -313,6 +835,8 @@ class Table:
     # We define the Rid for base page is positive, rid for tail page is negative
     # Cumulative Update
     def append_tail_record(self, columns, base_rid):
+        if self.tail_storage == TAIL_SPARSE:
+            return self._append_sparse_tail_record(columns, base_rid)
         columns = list(columns)
         tail_rid = self.next_tail_rid
         self.generate_rid(is_tail=True)
@@ -359,48 +883,579 @@ class Table:
         metadata_columns = (indirection, tail_rid, timestamp, schema_encoding)
         directory = []
 
-        for i in range(self.total_columns):
-            page_index = self._get_or_allocate_tail_page(base_range_index, i)
-            # Identidy if it is metadata or data in column
-            if i < 4:
-                offset = self._append_cell(True, i, page_index, metadata_columns[i])
-                if offset is None:
-                    return None
-                if metadata_columns[i] is not None:
-                    directory.append(('T', i, base_range_index, page_index, offset))
-                else:
-                    directory.append(('N', i, base_range_index, page_index, offset))
-            else: 
-                offset = self._append_cell(True, i, page_index, columns[i - 4])
-                if offset is None:
-                    return None
-                if columns[i - 4] is not None:
-                    directory.append(('T', i, base_range_index, page_index, offset))
+        if self.tail_storage == TAIL_ROW:
+            directory = self._append_row_tail_record(base_range_index, list(metadata_columns) + columns)
+            if directory is None:
+                return None
+        else:
+            for i in range(self.total_columns):
+                page_index = self._get_or_allocate_tail_page(base_range_index, i)
+                # Identidy if it is metadata or data in column
+                if i < 4:
+                    offset = self._append_cell(True, i, page_index, metadata_columns[i])
+                    if offset is None:
+                        return None
+                    if metadata_columns[i] is not None:
+                        directory.append(('T', i, base_range_index, page_index, offset))
+                    else:
+                        directory.append(('N', i, base_range_index, page_index, offset))
                 else: 
-                    directory.append(('N', i, base_range_index, page_index, offset))
+                    offset = self._append_cell(True, i, page_index, columns[i - 4])
+                    if offset is None:
+                        return None
+                    if columns[i - 4] is not None:
+                        directory.append(('T', i, base_range_index, page_index, offset))
+                    else: 
+                        directory.append(('N', i, base_range_index, page_index, offset))
         self.page_directory[tail_rid] = directory
+        self._widen_tail_zones(base_range_index, list(metadata_columns) + columns)
+        self._note_tail_timestamp(base_range_index, tail_rid, timestamp)
+        # Tails are cumulative, so the new tail row is the new latest record
+        self.record_cache.replace(base_rid, list(metadata_columns) + columns)
 
         # Update the indirection and SE of base record after the update
         self.update_indirection(base_rid, tail_rid)
         self.update_SE(base_rid, schema_encoding)
         return tail_rid
 
+    def _append_sparse_tail_record(self, columns, base_rid):
+        """
+        Sparse-mode append: metadata plus only the updated columns, so each column's
+        tail pages advance independently and 'N' directory entries carry no offset.
+        Every SPARSE_TAIL_CUMULATIVE_INTERVAL-th record of a chain is written in full.
+        """
+        base_direction = self.page_directory.get(base_rid)
+        if base_direction is None:
+            return None
+        columns = list(columns) + [None] * (self.num_columns - len(columns))
+        tail_rid = self.next_tail_rid
+        self.generate_rid(is_tail=True)
+        range_index = self._get_base_range_for_rid(base_rid)
+
+        previous_rid = None
+        indirection_loc = base_direction[INDIRECTION_COLUMN]
+        if indirection_loc[0] != 'N':
+            previous_rid = self._read_cell(False, INDIRECTION_COLUMN, indirection_loc[3], indirection_loc[4])
+        if previous_rid is None or previous_rid not in self.page_directory:
+            # First update: keep the full pre-update row as the chain's floor
+            previous_rid = self.append_tail_record_first_time(base_rid=base_rid, previous_rid=base_rid, column=None)
+            if previous_rid is None:
+                return None
+            self._sparse_depth[base_rid] = 0
+        se_loc = self.page_directory[previous_rid][SCHEMA_ENCODING_COLUMN]
+        previous_schema_encoding = self._read_cell(True, SCHEMA_ENCODING_COLUMN, se_loc[3], se_loc[4]) or 0
+
+        schema_encoding = previous_schema_encoding
+        for i in range(self.num_columns):
+            if columns[i] is not None:
+                schema_encoding |= 1 << (self.num_columns - 1 - i)
+
+        # Unknown depth (e.g. after reopening) forces a full record, which is always safe
+        depth = self._sparse_depth.get(base_rid, SPARSE_TAIL_CUMULATIVE_INTERVAL)
+        if depth + 1 >= SPARSE_TAIL_CUMULATIVE_INTERVAL:
+            latest = self.read_latest_record(base_rid)
+            for i in range(self.num_columns):
+                if columns[i] is None:
+                    columns[i] = latest[4 + i]
+            self._sparse_depth[base_rid] = 0
+        else:
+            self._sparse_depth[base_rid] = depth + 1
+
+        timestamp = int(time.time() * 1000)
+        values = [previous_rid, tail_rid, timestamp, schema_encoding] + columns
+        directory = []
+        for i in range(self.total_columns):
+            if values[i] is None:
+                directory.append(('N', i, range_index, 0, None))
+                continue
+            page_index = self._get_or_allocate_tail_page(range_index, i)
+            offset = self._append_cell(True, i, page_index, values[i])
+            if offset is None:
+                return None
+            directory.append(('T', i, range_index, page_index, offset))
+        self.page_directory[tail_rid] = directory
+        self._widen_tail_zones(range_index, values)
+        self._note_tail_timestamp(range_index, tail_rid, timestamp)
+        self.record_cache.invalidate(base_rid)
+
+        self.update_indirection(base_rid, tail_rid)
+        self.update_SE(base_rid, schema_encoding)
+        return tail_rid
+
+    def bulk_append_tail_records(self, updates):
+        """
+        Batched append_tail_record for a list of (base_rid, columns).
+        Produces the same tail records and RIDs as calling append_tail_record in order,
+        but previous versions are read in bulk, tail records are appended
+        column-at-a-time per page range, and base indirection / schema encoding
+        are rewritten once per base page.
+        Returns the new tail RIDs in update order, or None if a base record is missing.
+        """
+        if self.tail_storage != TAIL_CUMULATIVE:
+            # Sparse chains need per-record depth bookkeeping and row mode already
+            # writes a record with one pin, so append one by one
+            tail_rids = []
+            for base_rid, columns in updates:
+                tail_rid = self.append_tail_record(columns, base_rid)
+                if tail_rid is None:
+                    return None
+                tail_rids.append(tail_rid)
+            return tail_rids
+        base_rids = list(dict.fromkeys(base_rid for base_rid, _ in updates))
+        base_records = dict(zip(base_rids, self.read_records(base_rids)))
+        if any(record is None for record in base_records.values()):
+            return None
+        latest_rids = []
+        for base_rid in base_rids:
+            indirection = base_records[base_rid][INDIRECTION_COLUMN]
+            if indirection is not None and indirection != 0:
+                latest_rids.append(indirection)
+        latest_records = dict(zip(latest_rids, self.read_records(latest_rids)))
+
+        # previous (rid, record) per base record, advanced in memory as the batch is applied
+        previous = {}
+        for base_rid in base_rids:
+            base_record = base_records[base_rid]
+            indirection = base_record[INDIRECTION_COLUMN]
+            latest = latest_records.get(indirection) if indirection is not None else None
+            if latest is not None:
+                previous[base_rid] = (latest[RID_COLUMN], latest)
+            else:
+                previous[base_rid] = (base_rid, base_record)
+
+        pending = {}  # range index -> [(rid, values)] in append order
+        tail_rids = []
+        final_state = {}
+        timestamp = int(time.time() * 1000)
+        for base_rid, columns in updates:
+            columns = list(columns) + [None] * (self.num_columns - len(columns))
+            tail_rid = self.next_tail_rid
+            self.generate_rid(is_tail=True)
+            range_index = self._get_base_range_for_rid(base_rid)
+            previous_rid, previous_record = previous[base_rid]
+            previous_schema_encoding = previous_record[SCHEMA_ENCODING_COLUMN] or 0
+
+            schema_encoding = 0
+            for i in range(self.num_columns):
+                if columns[i] is not None:
+                    schema_encoding |= 1 << (self.num_columns - 1 - i)
+                else:
+                    columns[i] = previous_record[i + 4]
+            if previous_rid == base_rid:
+                snapshot_rid = self.next_tail_rid
+                self.generate_rid(is_tail=True)
+                snapshot = [base_rid, snapshot_rid, timestamp, (1 << self.num_columns) - 1]
+                snapshot.extend(base_records[base_rid][4:])
+                pending.setdefault(range_index, []).append((snapshot_rid, snapshot))
+                self.star_tail_record.add(snapshot_rid)
+                previous_rid = snapshot_rid
+
+            schema_encoding |= previous_schema_encoding
+            values = [previous_rid, tail_rid, timestamp, schema_encoding] + columns
+            pending.setdefault(range_index, []).append((tail_rid, values))
+            previous[base_rid] = (tail_rid, values)
+            final_state[base_rid] = (tail_rid, schema_encoding)
+            tail_rids.append(tail_rid)
+
+        for range_index, records in pending.items():
+            if not self._write_tail_records(range_index, records):
+                return None
+            for _, values in records:
+                self._widen_tail_zones(range_index, values)
+                self._note_tail_timestamp(range_index, values[RID_COLUMN], values[TIMESTAMP_COLUMN])
+
+        # Indirection and schema encoding of every touched base record, one pin per base page
+        for column in (INDIRECTION_COLUMN, SCHEMA_ENCODING_COLUMN):
+            by_page = {}
+            for base_rid, (tail_rid, schema_encoding) in final_state.items():
+                location = self.page_directory[base_rid][column]
+                value = tail_rid if column == INDIRECTION_COLUMN else schema_encoding
+                by_page.setdefault(location[3], []).append((location[4], value))
+            for page_index in sorted(by_page.keys()):
+                self._update_page_cells(False, column, page_index, by_page[page_index])
+        for base_rid, (tail_rid, _) in final_state.items():
+            self.record_cache.replace(base_rid, previous[base_rid][1])
+            direction = self.page_directory[base_rid]
+            indirection_index = direction[INDIRECTION_COLUMN]
+            if indirection_index[0] == 'N':
+                direction[INDIRECTION_COLUMN] = ('B',) + tuple(indirection_index[1:])
+        return tail_rids
+
+    def _write_tail_records(self, range_index, records, skip_none=False):
+        """
+        Write [(tail rid, values)] into the range's tail pages column-at-a-time and
+        set their directories. With skip_none, None cells take no page slot.
+        """
+        if self.tail_storage == TAIL_ROW:
+            for rid, values in records:
+                directory = self._append_row_tail_record(range_index, values)
+                if directory is None:
+                    return False
+                self.page_directory[rid] = directory
+            return True
+        directories = [[None] * self.total_columns for _ in records]
+        for i in range(self.total_columns):
+            positions = []
+            for pos, (_, values) in enumerate(records):
+                if skip_none and values[i] is None:
+                    directories[pos][i] = ('N', i, range_index, 0, None)
+                else:
+                    positions.append(pos)
+            column_values = [records[pos][1][i] for pos in positions]
+            written = 0
+            while written < len(positions):
+                page_index = self._get_or_allocate_tail_page(range_index, i)
+                result = self._append_cells(True, i, page_index, column_values, written)
+                if result is None:
+                    return False
+                offset, n = result
+                for j in range(n):
+                    mark = 'N' if column_values[written + j] is None else 'T'
+                    directories[positions[written + j]][i] = (mark, i, range_index, page_index, offset + j)
+                written += n
+        for (rid, _), directory in zip(records, directories):
+            self.page_directory[rid] = directory
+        return True
+
+    def collect_tail_garbage(self, keep_versions=TAIL_GC_KEEP_VERSIONS, horizon_timestamp=None):
+        """
+        Tail GC. Per live base record keep its latest tail, the keep_versions versions
+        before it and, with horizon_timestamp, every version still current at or after
+        that time. Kept records are copied into fresh tail pages, the rest are dropped
+        with their pages, directory and star entries (tails of deleted records included).
+        The oldest kept record is rewritten as a full star record pointing at the base,
+        so it becomes the new floor for select_version. RIDs do not change, so TPS stays valid.
+        Returns the number of tail records dropped.
+        """
+        with self._merge_lock:
+            with self.latch:
+                # Install finished merges first so TPS reflects every merged tail
+                self.apply_pending_merges_foreground()
+                base_rids = self.get_base_rids()
+                indirections = self.read_column(base_rids, INDIRECTION_COLUMN)
+                kept = {}  # range index -> [(tail rid, values)]
+                new_stars = set()
+                for base_rid, tail_rid in zip(base_rids, indirections):
+                    chain = []
+                    while self.is_rid_tail_helper(tail_rid) and tail_rid in self.page_directory:
+                        chain.append((tail_rid, self.read_record(tail_rid)))
+                        tail_rid = chain[-1][1][INDIRECTION_COLUMN]
+                    if len(chain) == 0:
+                        continue
+                    n = 1 + max(0, keep_versions or 0)
+                    if horizon_timestamp is not None:
+                        current = 0
+                        while current < len(chain) and chain[current][1][TIMESTAMP_COLUMN] >= horizon_timestamp:
+                            current += 1
+                        n = max(n, current + 1)
+                    chain = chain[:n]
+                    floor_rid, floor = chain[-1]
+                    if self.tail_storage == TAIL_SPARSE:
+                        self._fill_from_older_tails(floor)
+                    floor[INDIRECTION_COLUMN] = base_rid
+                    new_stars.add(floor_rid)
+                    range_index = self.page_directory[floor_rid][RID_COLUMN][2]
+                    kept.setdefault(range_index, []).extend(chain)
+
+                old_tail_rids = [rid for rid in self.page_directory if rid < 0]
+                old_pages = set()
+                for range_pages in self.tail_range_pages.values():
+                    for column, pages in enumerate(range_pages):
+                        for page_index in pages:
+                            old_pages.add((column, page_index))
+                for rid in old_tail_rids:
+                    del self.page_directory[rid]
+
+                # Every kept record is already in memory: free the old pages, then refill from page 0
+                if self.bufferpool is not None:
+                    for column, page_index in old_pages:
+                        self.bufferpool.discard_page(self.name, True, column, page_index, flush=False)
+                        if self.disk_manager is not None:
+                            self.disk_manager.delete_page(self.name, True, column, page_index)
+                self.tail_pages = [[] for _ in range(self.tail_columns)]
+                self.current_tail_page_index = [0] * self.tail_columns
+                self.tail_range_pages = {}
+                pages_since_merge = self._tail_pages_created_since_merge
+                dropped = len(old_tail_rids)
+                for range_index in sorted(kept.keys()):
+                    records = kept[range_index]
+                    self._write_tail_records(range_index, records, skip_none=self.tail_storage == TAIL_SPARSE)
+                    dropped -= len(records)
+                if len(self.tail_range_pages) == 0:
+                    self.tail_range_pages = {0: [[] for _ in range(self.tail_columns)]}
+                self._tail_pages_created_since_merge = pages_since_merge
+                self.star_tail_record = new_stars
+                self.record_cache.clear()
+                self._version_chains = {}
+                return dropped
+
+    def _page_record_count(self, is_tail, column, page_index):
+        frame = self._fetch_frame(is_tail, column, page_index, pin=True)
+        if frame is None:
+            return 0
+        try:
+            return frame.num_records
+        finally:
+            self._unpin(is_tail, column, page_index)
+
+    def range_fill_factors(self):
+        """
+        Fill factor per page range: live base records / slots allocated in the base pages
+        holding them. Deleted slots stay allocated until compaction rewrites the range.
+        """
+        with self.latch:
+            live = {}
+            pages = {}
+            for rid in self.base_rids:
+                entry = self.page_directory[rid][RID_COLUMN]
+                live[entry[2]] = live.get(entry[2], 0) + 1
+                pages.setdefault(entry[2], set()).add(entry[3])
+            fills = {}
+            for range_index, count in live.items():
+                slots = sum(self._page_record_count(False, RID_COLUMN, page) for page in pages[range_index])
+                fills[range_index] = count / slots if slots > 0 else 1.0
+            return fills
+
+    def compact_base_ranges(self, fill_threshold=COMPACTION_FILL_THRESHOLD):
+        """
+        Rewrite each page range whose fill factor is below fill_threshold into dense new
+        base pages, then free every base page no live record points to any more.
+        The range taking inserts is skipped. RIDs do not change, so indexes, tail chains
+        and TPS stay valid; only page directory entries move. Runs under the merge lock,
+        like tail GC, and like the merge copies data cells without the table latch.
+        Returns the number of ranges rewritten.
+        """
+        with self._merge_lock:
+            with self.latch:
+                self.apply_pending_merges_foreground()
+                self._deletes_since_compaction = 0
+                active_range = self._base_range_from_page_index(self.current_base_page_index[RID_COLUMN])
+                targets = [range_index for range_index, fill in sorted(self.range_fill_factors().items())
+                           if range_index != active_range and fill < fill_threshold]
+                if len(targets) == 0:
+                    return 0
+                # Snapshot of each target range: (rid, copy of its directory)
+                snapshots = {range_index: [] for range_index in targets}
+                for rid in self.get_base_rids():
+                    directory = self.page_directory[rid]
+                    entries = snapshots.get(directory[RID_COLUMN][2])
+                    if entries is not None:
+                        entries.append((rid, list(directory)))
+            compacted = 0
+            for range_index in targets:
+                if self._compact_range(snapshots[range_index]):
+                    compacted += 1
+            self._free_unreferenced_base_pages()
+            return compacted
+
+    def _copy_to_new_pages(self, column, values):
+        """
+        Append values to fresh base pages of column. Returns the (page, offset) of each
+        value and the new pages, or None if a page cannot be written.
+        """
+        locations = []
+        new_pages = []
+        page_index = None
+        written = 0
+        while written < len(values):
+            if page_index is None:
+                # Inserts allocate pages under the latch too
+                with self.latch:
+                    page_index = len(self.base_pages[column])
+                    self.base_pages[column].append(None)
+                new_pages.append(page_index)
+            result = self._append_cells(False, column, page_index, values, written)
+            if result is None:
+                return None
+            offset, n = result
+            if n == 0:
+                page_index = None
+                continue
+            locations.extend((page_index, offset + j) for j in range(n))
+            written += n
+        return locations, new_pages
+
+    def _compact_range(self, entries):
+        """
+        Copy the base cells of one range's live records into fresh pages.
+        Base data cells are never updated in place and the merge cannot run, so data
+        columns are copied from the snapshot without the latch. Metadata cells change
+        with updates and deletes, so they are copied and the directory is swapped under it.
+        """
+        data_locations = {}
+        page_zones = {}
+        for column in range(4, self.total_columns):
+            by_page = {}
+            for i, (_rid, directory) in enumerate(entries):
+                by_page.setdefault(directory[column][3], []).append(i)
+            values = [None] * len(entries)
+            for page_index, positions in by_page.items():
+                offsets = [entries[i][1][column][4] for i in positions]
+                for i, value in zip(positions, self._read_page_cells(False, column, page_index, offsets)):
+                    values[i] = value
+            copied = self._copy_to_new_pages(column, values)
+            if copied is None:
+                return False
+            locations, new_pages = copied
+            data_locations[column] = locations
+            for (page_index, _offset), value in zip(locations, values):
+                self._widen_zone(page_zones, (column, page_index), value, value)
+            # The new pages are never appended to, so they can be stored encoded
+            if COMPRESS_MERGED_PAGES:
+                for page_index in new_pages:
+                    self._compress_base_page(column, page_index)
+
+        with self.latch:
+            live = [i for i, (rid, _directory) in enumerate(entries) if rid in self.base_rids]
+            rids = [entries[i][0] for i in live]
+            new_directories = [list(self.page_directory[rid]) for rid in rids]
+            for column in range(4):
+                copied = self._copy_to_new_pages(column, self.read_column(rids, column))
+                if copied is None:
+                    return False
+                for directory, (page_index, offset) in zip(new_directories, copied[0]):
+                    old = directory[column]
+                    directory[column] = (old[0], column, old[2], page_index, offset)
+            for column, locations in data_locations.items():
+                for directory, i in zip(new_directories, live):
+                    page_index, offset = locations[i]
+                    old = directory[column]
+                    directory[column] = (old[0], column, old[2], page_index, offset)
+            # Zero the old RID cells in the same step, so scans of the old pages (freed only
+            # after the last range) neither return a moved record twice nor its stale indirection
+            old_cells = {}
+            for rid, directory in zip(rids, new_directories):
+                old = self.page_directory[rid][RID_COLUMN]
+                old_cells.setdefault(old[3], []).append((old[4], 0))
+                self.page_directory[rid] = directory
+            for page_index in sorted(old_cells.keys()):
+                self._update_page_cells(False, RID_COLUMN, page_index, old_cells[page_index])
+            self.page_zone_maps.update(page_zones)
+        return True
+
+    def _free_unreferenced_base_pages(self):
+        """
+        Drop base pages without live records, except the pages inserts are writing to.
+        References are counted from a copy of the directory without the latch: while the
+        merge lock is held, only inserts point records at existing pages, and only at the
+        insert pages or at pages allocated after the copy, none of which are freed.
+        """
+        with self.latch:
+            directories = list(self.page_directory.items())
+            insert_pages = list(self.current_base_page_index)
+            page_counts = [len(pages) for pages in self.base_pages]
+        refs = set()
+        for rid, directory in directories:
+            if rid > 0:
+                for entry in directory:
+                    refs.add((entry[1], entry[3]))
+        with self.latch:
+            for column in range(self.total_columns):
+                for page_index in range(page_counts[column]):
+                    page_key = (column, page_index)
+                    if page_index == insert_pages[column] or page_key in refs or page_key in self.freed_base_pages:
+                        continue
+                    self.page_zone_maps.pop(page_key, None)
+                    if self.bufferpool is not None:
+                        self.bufferpool.discard_page(self.name, False, column, page_index, flush=False)
+                    if self.disk_manager is not None:
+                        self.disk_manager.delete_page(self.name, False, column, page_index)
+                    self.freed_base_pages.add(page_key)
+
     def delete_record(self, rid):
         if rid is None or rid not in self.page_directory:
             return False
         direction = self.page_directory[rid]
         col_index= direction[RID_COLUMN]
         if self.is_rid_tail_helper(rid):
-            status = self._update_cell(True, RID_COLUMN, col_index[3], col_index[4], 0)
+            status = self._update_cell(True, self._tail_cell_column(col_index), col_index[3], col_index[4], 0)
         else:
             status = self._update_cell(False, RID_COLUMN, col_index[3], col_index[4], 0)
         value = self.page_directory.pop(rid, None)
+        self.record_cache.invalidate(rid)
+        self._version_chains.pop(rid, None)
         if rid > 0:
             self.base_rids.discard(rid)
             self.tps.pop(rid, None)
             self._sorted_base_rids_cache = None
+            self._note_deletes(1)
         return status & (value != None)
-    
+
+    def delete_base_records(self, rids):
+        """
+        Bulk delete_record for base records: RID cells are zeroed one page at a time.
+        Returns the number of records deleted.
+        """
+        cells_by_page = {}
+        deleted = 0
+        for rid in rids:
+            if rid is None or rid <= 0:
+                continue
+            direction = self.page_directory.pop(rid, None)
+            if direction is None:
+                continue
+            entry = direction[RID_COLUMN]
+            cells_by_page.setdefault(entry[3], []).append((entry[4], 0))
+            self.record_cache.invalidate(rid)
+            self._version_chains.pop(rid, None)
+            self.base_rids.discard(rid)
+            self.tps.pop(rid, None)
+            deleted += 1
+        for page_index in sorted(cells_by_page.keys()):
+            self._update_page_cells(False, RID_COLUMN, page_index, cells_by_page[page_index])
+        self._sorted_base_rids_cache = None
+        self._note_deletes(deleted)
+        return deleted
+
+    def _note_deletes(self, count):
+        # Enough deletes wake the merge thread to compact sparse ranges
+        self._deletes_since_compaction += count
+        if self._deletes_since_compaction >= COMPACTION_DELETE_THRESHOLD:
+            self._deletes_since_compaction = 0
+            self._start_merge_thread()
+            self._compaction_request.set()
+
+    def truncate(self):
+        """
+        Remove every record. All page files and bufferpool frames of the table are dropped
+        in one pass and the table starts over empty, keeping its schema and index definitions.
+        """
+        with self._merge_lock:
+            with self.latch:
+                self._pending_merge_jobs = []
+                if self.bufferpool is not None:
+                    self.bufferpool.discard_table(self.name)
+                if self.disk_manager is not None:
+                    self.disk_manager.delete_table_pages(self.name)
+
+                self.page_directory = {}
+                self.base_pages = [[None] for _ in range(self.total_columns)]
+                self.tail_pages = [[None] for _ in range(self.tail_columns)]
+                self.current_base_page_index = [0] * self.total_columns
+                self.current_tail_page_index = [0] * self.tail_columns
+                self.tail_range_pages = {0: [[0] for _ in range(self.tail_columns)]}
+                self.freed_base_pages = set()
+                self.next_base_rid = 1
+                self.next_tail_rid = -1
+                self.base_rids = set()
+                self._sorted_base_rids_cache = None
+                self.tps = {}
+                self.star_tail_record = set()
+                self._sparse_depth = {}
+                self._tail_pages_created_since_merge = 0
+                self._deletes_since_compaction = 0
+
+                self.page_zone_maps = {}
+                self.range_zone_maps = {}
+                self.tail_zone_maps = {}
+                self._zone_trackers = {}
+                self.record_cache.clear()
+                self.tail_ts_index = {}
+                self._tail_ts_counts = {}
+                self._version_chains = {}
+                self.dictionaries = {column: StringDictionary() for column in self.dictionaries}
+                self.index.clear()
+
 
     def read_record(self, rid):
         if rid is None:
@@ -409,6 +1464,11 @@ class Table:
         if direction is None:
             return None
         record = []
+        if self.is_rid_tail_helper(rid) and direction[RID_COLUMN][0] == 'R':
+            # Row-mode tail: the whole record is in one page
+            rid_entry = direction[RID_COLUMN]
+            offsets = [col_index[4] if col_index[0] == 'R' else None for col_index in direction]
+            return self._read_page_cells(True, self.row_column, rid_entry[3], offsets)
         if self.is_rid_tail_helper(rid):
             for i in range(len(direction)):
                 col_index = direction[i]
@@ -432,6 +1492,9 @@ class Table:
         return record
     
     def read_latest_record(self, base_rid):
+        cached = self.record_cache.get(base_rid)
+        if cached is not None:
+            return list(cached)
         record = self.read_record(base_rid)
         if record is None:
             return None
@@ -444,15 +1507,176 @@ class Table:
             if need_tail_lookup:
                 tail = self.read_record(latest_tail_rid)
                 if tail is not None:
+                    if self.tail_storage == TAIL_SPARSE:
+                        self._fill_from_older_tails(tail, tps)
                     latest_record = tail
         for i in range(len(latest_record)):
             if latest_record[i] is None:
                 latest_record[i] = record[i]
+        self.record_cache.put(base_rid, latest_record)
         return latest_record
     
+    def read_column(self, rids, column):
+        """
+        One physical column of many records, grouped by page so each page is pinned once.
+        Missing RIDs and 'N' cells give None.
+        """
+        values = [None] * len(rids)
+        by_page = {}
+        for pos, rid in enumerate(rids):
+            if rid is None:
+                continue
+            direction = self.page_directory.get(rid)
+            if direction is None:
+                continue
+            col_index = direction[column]
+            if col_index[0] == 'N' or col_index[4] is None:
+                continue
+            is_tail = self.is_rid_tail_helper(rid)
+            physical_column = self._tail_cell_column(col_index) if is_tail else column
+            page_key = (is_tail, physical_column, col_index[3])
+            by_page.setdefault(page_key, []).append((pos, col_index[4]))
+        for page_key in sorted(by_page.keys()):
+            is_tail, physical_column, page_index = page_key
+            cells = by_page[page_key]
+            page_values = self._read_page_cells(is_tail, physical_column, page_index, [offset for _, offset in cells])
+            for (pos, _), value in zip(cells, page_values):
+                values[pos] = value
+        return values
+
+    def read_records(self, rids):
+        """
+        Bulk read_record, column-at-a-time. Missing RIDs give None in the result.
+        """
+        records = [None] * len(rids)
+        for pos, rid in enumerate(rids):
+            if rid is not None and rid in self.page_directory:
+                records[pos] = [None] * self.total_columns
+        for i in range(self.total_columns):
+            for pos, value in enumerate(self.read_column(rids, i)):
+                if records[pos] is not None:
+                    records[pos][i] = value
+        return records
+
+    def read_latest_column(self, base_rids, column, indirections=None):
+        """
+        Latest value of one data column for many base records, reading only the
+        base indirection and that column (from the tail when newer than TPS).
+        indirections may carry the base indirection cells already read by a scan.
+        Deleted records give None.
+        """
+        data_column = 4 + column
+        if indirections is None:
+            indirections = self.read_column(base_rids, INDIRECTION_COLUMN)
+        from_tail = []
+        from_base = []
+        for pos, latest_tail_rid in enumerate(indirections):
+            if latest_tail_rid is not None and self.is_rid_tail_helper(latest_tail_rid):
+                tps = self.tps.get(base_rids[pos])
+                if tps is None or latest_tail_rid < tps:
+                    from_tail.append(pos)
+                    continue
+            from_base.append(pos)
+        values = [None] * len(base_rids)
+        tail_values = self.read_column([indirections[pos] for pos in from_tail], data_column)
+        for pos, value in zip(from_tail, tail_values):
+            if value is not None:
+                values[pos] = value
+            elif self.tail_storage == TAIL_SPARSE:
+                # The column lives in an older record of the chain
+                latest = self.read_latest_record(base_rids[pos])
+                values[pos] = None if latest is None else latest[data_column]
+            else:
+                from_base.append(pos)
+        base_values = self.read_column([base_rids[pos] for pos in from_base], data_column)
+        for pos, value in zip(from_base, base_values):
+            values[pos] = value
+        return values
+
+    def read_latest_records(self, base_rids):
+        """
+        Bulk read_latest_record: cached records are served directly, the rest come from
+        one batched read of the base records and one of their latest tails.
+        """
+        records = [None] * len(base_rids)
+        missing = []
+        for pos, rid in enumerate(base_rids):
+            cached = self.record_cache.get(rid) if rid is not None else None
+            if cached is not None:
+                records[pos] = list(cached)
+            else:
+                missing.append(pos)
+        if len(missing) == 0:
+            return records
+        missing_rids = [base_rids[pos] for pos in missing]
+        base_records = self.read_records(missing_rids)
+        tail_positions = []
+        for i, record in enumerate(base_records):
+            if record is None:
+                continue
+            latest_tail_rid = record[INDIRECTION_COLUMN]
+            if latest_tail_rid is None or not self.is_rid_tail_helper(latest_tail_rid):
+                continue
+            tps = self.tps.get(missing_rids[i])
+            if tps is None or latest_tail_rid < tps:
+                tail_positions.append(i)
+        tails = self.read_records([base_records[i][INDIRECTION_COLUMN] for i in tail_positions])
+        for i, tail in zip(tail_positions, tails):
+            if tail is None:
+                continue
+            if self.tail_storage == TAIL_SPARSE:
+                self._fill_from_older_tails(tail, self.tps.get(missing_rids[i]))
+            record = base_records[i]
+            for c in range(len(tail)):
+                if tail[c] is None:
+                    tail[c] = record[c]
+            base_records[i] = tail
+        for pos, rid, record in zip(missing, missing_rids, base_records):
+            if record is None:
+                continue
+            records[pos] = record
+            self.record_cache.put(rid, record)
+        return records
+
     """
     Modified function for enabling tracing the version
     """
+    def _read_tail_cell(self, rid, column):
+        entry = self.page_directory[rid][column]
+        if entry[0] == 'N':
+            return None
+        if self.is_rid_tail_helper(rid):
+            return self._read_cell(True, self._tail_cell_column(entry), entry[3], entry[4])
+        return self._read_cell(False, column, entry[3], entry[4])
+
+    def _version_chain(self, base_rid, latest_rid):
+        """
+        RIDs of every reachable version of a base record, oldest first, ending at latest_rid.
+        Only indirection cells are read, and only for tails newer than the cached chain.
+        If the oldest tail is not a star snapshot, the base rid itself is the floor.
+        """
+        chain = self._version_chains.get(base_rid)
+        if chain is not None and chain[-1] == latest_rid:
+            return chain
+        known = None if chain is None else chain[-1]
+        newer = []
+        rid = latest_rid
+        while rid != known:
+            newer.append(rid)
+            prev_rid = self._read_tail_cell(rid, INDIRECTION_COLUMN)
+            if self.is_rid_tail_helper(prev_rid) and prev_rid in self.page_directory:
+                rid = prev_rid
+                continue
+            if rid not in self.star_tail_record and prev_rid is not None and prev_rid > 0:
+                newer.append(prev_rid)
+            # Reached the floor without meeting the cached chain: it is stale
+            chain = None
+            break
+        newer.reverse()
+        chain = newer if chain is None else chain + newer
+        self._version_chains[base_rid] = chain
+        return chain
+
     def read_latest_record_modified(self, base_rid, relative_version):
         record = self.read_record(base_rid)
         if record is None:
@@ -470,34 +1694,72 @@ class Table:
         if latest_record is None:
             return record
         if relative_version >= 0:
+            if self.tail_storage == TAIL_SPARSE:
+                self._fill_from_older_tails(latest_record, self.tps.get(base_rid))
             for i in range(len(latest_record)):
                 if latest_record[i] is None:
                     latest_record[i] = record[i]
             return latest_record
 
-        steps = -relative_version
-        cur_rid = latest_rid
-        cur_record = latest_record
-        while steps > 0:
-            prev_rid = cur_record[0]
-            if prev_rid is None or prev_rid == 0:
-                break
-            # Keep the earliest snapshot as the floor for very old versions.
-            if cur_rid in self.star_tail_record and not self.is_rid_tail_helper(prev_rid):
-                break
-
-            prev_record = self.read_record(prev_rid)
-            if prev_record is None:
-                break
-            cur_rid = prev_rid
-            cur_record = prev_record
-            steps -= 1
+        # Version chain: the k-th previous version is one list lookup and one record read
+        chain = self._version_chain(base_rid, latest_rid)
+        cur_rid = chain[max(0, len(chain) - 1 + relative_version)]
+        cur_record = latest_record if cur_rid == latest_rid else self.read_record(cur_rid)
+        if cur_record is None:
+            cur_record = latest_record
 
+        if self.tail_storage == TAIL_SPARSE:
+            # Older versions may predate the merged base, so fill only from the chain
+            self._fill_from_older_tails(cur_record)
         for i in range(len(cur_record)):
             if cur_record[i] is None:
                 cur_record[i] = record[i]
         return cur_record
 
+    def read_record_as_of(self, base_rid, timestamp):
+        """
+        The version of a base record that was current at timestamp (ms), or None if it
+        was inserted later. Before the oldest kept version the chain floor is returned.
+        """
+        base_direction = self.page_directory.get(base_rid)
+        if base_direction is None:
+            return None
+        base = self.read_record(base_rid)
+        if base[TIMESTAMP_COLUMN] is not None and base[TIMESTAMP_COLUMN] > timestamp:
+            return None
+        tail_rid = base[INDIRECTION_COLUMN]
+        if not self.is_rid_tail_helper(tail_rid) or tail_rid not in self.page_directory:
+            # Never updated: the base is the only version
+            return base
+        # Timestamps rise along the chain, so binary search it. The timestamp index decides
+        # most probes from the rid alone; the rest read just one timestamp cell.
+        chain = self._version_chain(base_rid, tail_rid)
+        newer_than, older_than = self._tail_rid_bounds(base_direction[RID_COLUMN][2], timestamp)
+        low = 0
+        high = len(chain)
+        while low < high:
+            middle = (low + high) // 2
+            rid = chain[middle]
+            if older_than is not None and rid >= older_than:
+                current = True
+            elif newer_than is not None and rid <= newer_than:
+                current = False
+            else:
+                tail_timestamp = self._read_tail_cell(rid, TIMESTAMP_COLUMN)
+                current = tail_timestamp is not None and tail_timestamp <= timestamp
+            if current:
+                low = middle + 1
+            else:
+                high = middle
+        tail_rid = chain[max(0, low - 1)]
+        record = self.read_record(tail_rid)
+        if self.tail_storage == TAIL_SPARSE and self.is_rid_tail_helper(tail_rid):
+            self._fill_from_older_tails(record)
+        for i in range(len(record)):
+            if record[i] is None:
+                record[i] = base[i]
+        return record
+
     def update_indirection(self, base_rid, new_tail_rid):
         if base_rid not in self.page_directory:
             return
@@ -519,12 +1781,13 @@ class Table:
 
 
     def allocate_new_page(self, column_index, is_tail):
+        # Merge appends its own pages, so the new page is always the last one
         if (is_tail):
             self.tail_pages[column_index].append(None)
-            self.current_tail_page_index[column_index] += 1
+            self.current_tail_page_index[column_index] = len(self.tail_pages[column_index]) - 1
         else:
             self.base_pages[column_index].append(None)
-            self.current_base_page_index[column_index] += 1
+            self.current_base_page_index[column_index] = len(self.base_pages[column_index]) - 1
 
     def generate_rid(self, is_tail):
         if is_tail:
@@ -549,17 +1812,19 @@ class Table:
                 self._tail_pages_created_since_merge = 0
                 return
             range_snapshots = {}
-            for rid in list(self.base_rids):
-                direction = self.page_directory.get(rid)
-                if direction is None:
-                    continue
-                range_index = direction[RID_COLUMN][2]
-                indirection_loc = direction[INDIRECTION_COLUMN]
-                if indirection_loc[0] == 'N' or indirection_loc[4] is None:
-                    snapshot_tail_rid = None
-                else:
-                    snapshot_tail_rid = self._read_cell(False, INDIRECTION_COLUMN, indirection_loc[3], indirection_loc[4])
-                range_snapshots.setdefault(range_index, []).append((rid, list(direction), snapshot_tail_rid))
+            # Inserts after the snapshot land on these pages, so a merge never reclaims them
+            insert_pages = list(self.current_base_page_index)
+            # Physical-order scan: one pinned read of the indirection column per base page
+            for rids, indirections in self.scan_base_pages():
+                for rid, snapshot_tail_rid in zip(rids, indirections):
+                    direction = self.page_directory[rid]
+                    range_index = direction[RID_COLUMN][2]
+                    range_snapshots.setdefault(range_index, []).append((rid, list(direction), snapshot_tail_rid))
+            # Writes from here on are tracked per range until the merge is installed
+            trackers = {}
+            for range_index in range_snapshots:
+                trackers[range_index] = ({}, {})
+                self._zone_trackers.setdefault(range_index, []).append(trackers[range_index])
 
         for range_index, entries in range_snapshots.items():
             if len(entries) == 0:
@@ -569,17 +1834,24 @@ class Table:
             old_pages_by_col = {col + 4: set() for col in range(self.num_columns)}
             current_write_page = {col + 4: None for col in range(self.num_columns)}
             merged_locations = {}
+            merged_zones = {}
+            # Exact [min, max] of the range's latest values, by data column
+            range_zones = {}
+            complete = True
 
             for rid, old_dir, snapshot_tail_rid in entries:
-                latest = self._materialize_latest_from_snapshot(old_dir, snapshot_tail_rid)
+                latest = self._materialize_latest_from_snapshot(old_dir, snapshot_tail_rid, rid)
                 if latest is None:
                     continue
+                for page_col in range(4, self.total_columns):
+                    self._widen_zone(range_zones, page_col, latest[page_col], latest[page_col])
 
                 row_locations = {}
                 row_ok = True
                 for col in range(self.num_columns):
                     page_col = col + 4
-                    old_pages_by_col[page_col].add(old_dir[page_col][3])
+                    if old_dir[page_col][3] != insert_pages[page_col]:
+                        old_pages_by_col[page_col].add(old_dir[page_col][3])
 
                     target_page = current_write_page[page_col]
                     if target_page is None or not self._page_has_capacity(False, page_col, target_page):
@@ -598,13 +1870,22 @@ class Table:
                         row_ok = False
                         break
                     row_locations[page_col] = ('B', page_col, range_index, target_page, offset)
+                    self._widen_zone(merged_zones, (page_col, target_page), latest[page_col], latest[page_col])
 
                 if row_ok and len(row_locations) == self.num_columns:
                     merged_locations[rid] = row_locations
+                else:
+                    complete = False
+
+            # Merged pages are never appended to again, so they can be stored encoded
+            if COMPRESS_MERGED_PAGES:
+                for page_col, target_page in merged_zones:
+                    self._compress_base_page(page_col, target_page)
 
             with self.latch:
                 self._pending_merge_jobs.append(
-                    (range_index, entries, merged_locations, old_pages_by_col)
+                    (range_index, entries, merged_locations, old_pages_by_col, merged_zones,
+                     range_zones if complete else None, trackers[range_index])
                 )
 
         with self.latch:
@@ -615,10 +1896,13 @@ class Table:
             has_request = self._merge_request.wait(timeout=0.2)
             if self._merge_stop.is_set():
                 break
-            if not has_request:
-                continue
-            self._merge_request.clear()
-            self.__merge()
+            if has_request:
+                self._merge_request.clear()
+                with self._merge_lock:
+                    self.__merge()
+            if self._compaction_request.is_set():
+                self._compaction_request.clear()
+                self.compact_base_ranges()
 
     def get_base_rids(self):
         # Live base records only.
@@ -634,7 +1918,8 @@ class Table:
             jobs = self._pending_merge_jobs
             self._pending_merge_jobs = []
             applied = 0
-            for range_index, entries, merged_locations, old_pages_by_col in jobs:
+            for job in jobs:
+                range_index, entries, merged_locations, old_pages_by_col, merged_zones, range_zones, tracker = job
                 old_pd = self.page_directory
                 new_pd = dict(old_pd)
                 merged_rids = []
@@ -658,9 +1943,13 @@ class Table:
                     base pages after a completion of a merge.
                     """
                     self.tps[rid] = snapshot_tail_rid if self.is_rid_tail_helper(snapshot_tail_rid) else None
+                    self.record_cache.invalidate(rid)
                     merged_rids.append(rid)
 
                 self.page_directory = new_pd
+                # Merged pages are summarised exactly from the values the merge wrote
+                self.page_zone_maps.update(merged_zones)
+                self._install_range_zones(range_index, range_zones, tracker)
                 if len(merged_rids) == len(entries) and len(merged_rids) > 0:
                     reclaim_batches.append(old_pages_by_col)
                 applied += len(merged_rids)
@@ -685,6 +1974,8 @@ class Table:
         f.write(str(self.key) + "\n")
         f.write(str(self.next_base_rid) + "\n")
         f.write(str(self.next_tail_rid) + "\n")
+        f.write(self.tail_storage + "\n")
+        f.write(",".join(self.column_types) + "\n")
         f.close()
 
         pd_path = os.path.join(disk_manager.path, self.name, "page_directory.txt")
@@ -715,6 +2006,31 @@ class Table:
             f.write(str(int(rid)) + "\n")
         f.close()
 
+        # Tail timestamp index: range|timestamp|tail rid, samples in append order
+        ts_path = os.path.join(disk_manager.path, self.name, "tail_ts_index.txt")
+        f = open(ts_path, "w")
+        for range_index in sorted(self.tail_ts_index.keys()):
+            timestamps, rids = self.tail_ts_index[range_index]
+            for timestamp, rid in zip(timestamps, rids):
+                f.write(f"{int(range_index)}|{int(timestamp)}|{int(rid)}\n")
+        f.close()
+
+        # String dictionaries: column|string as JSON, in code order
+        dictionary_path = os.path.join(disk_manager.path, self.name, "string_dictionaries.txt")
+        f = open(dictionary_path, "w")
+        for column in sorted(self.dictionaries.keys()):
+            for value in self.dictionaries[column].strings:
+                f.write(f"{int(column)}|{json.dumps(value)}\n")
+        f.close()
+
+        # Zone maps: P|column|page|min|max, R|range|column|min|max, T|range|column|min|max
+        zone_path = os.path.join(disk_manager.path, self.name, "zone_maps.txt")
+        f = open(zone_path, "w")
+        for mark, zones in (("P", self.page_zone_maps), ("R", self.range_zone_maps), ("T", self.tail_zone_maps)):
+            for (first, second), (low, high) in sorted(zones.items()):
+                f.write(f"{mark}|{int(first)}|{int(second)}|{int(low)}|{int(high)}\n")
+        f.close()
+
     def shutdown(self):
         if self._merge_thread is None:
             return